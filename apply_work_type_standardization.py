@@ -8,65 +8,49 @@ This script:
 3. Generates a detailed report
 
 Usage:
-    python3 apply_work_type_standardization.py [--dry-run] [--all] [--no-backup]
+    python3 apply_work_type_standardization.py [--dry-run] [--all] [--no-backup] [--jobs N] [--force]
+                                               [--rules FILE]
 
 Options:
     --dry-run: Show what would change without modifying files
-    --all: Process all JSON files in current directory and subdirectories
+    --all: Process all JSON files in current directory and subdirectories,
+           except config/ and the split output in data/
     --no-backup: Don't create backup files before modifying
+    --jobs N: Number of files to process in parallel with --all (default: CPU count)
+    --force: Rewrite files even if they are already standardized
+    --rules FILE: Work type rules file (default: config/work-type-rules.json)
+
+Backups go to the content-addressed store in .backups/ (see backup_store.py).
+To list or restore them:
+    python3 apply_work_type_standardization.py --list-backups FILE [FILE ...]
+    python3 apply_work_type_standardization.py --restore FILE [FILE ...] [--backup NAME]
 """
 
+import argparse
+import io
 import json
-import sys
+import os
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from itertools import takewhile
 from pathlib import Path
 
+from backup_store import DEFAULT_BACKUP_DIR, backup_file, list_backups, restore_file
+from character_stream import CHUNK_SIZE, CharacterStream, CharacterWriter, report_peak_memory
+from split_json_by_work_type import COMPACT_FORMAT
+from work_type_rules import DEFAULT_RULES_FILE, load_rules
 
-# Ambiguous work type resolutions
-AMBIGUOUS_RESOLUTIONS = {
-    ("Dragon Ball", "Android 16"): "Manga",
-    ("Dragon Ball", "Android 19"): "Manga",
-    ("Dragon Ball", "Cell"): "Manga",
-    ("Ghost in the Shell", "Puppetmaster"): "Manga",
-    ("½ Prince", "Self-Aware NPCs"): "Light Novel",
-}
-
-# Work type standardization mapping
-WORK_TYPE_MAPPING = {
-    "Film": "Movie",
-    "Animated Movie": "Movie",
-    "Anime Movie": "Movie",
-    "Short Film": "Movie",
-    "Fanfic": "Fan Fiction",
-    "Fan Work": "Fan Fiction",
-    "Web Original": "Web Fiction",
-    "Web Serial": "Web Fiction",
-    "Web Serial Novel": "Web Fiction",
-    "Blog Fiction": "Web Fiction",
-    "Literature": "Book",
-    "Book Series": "Book",
-    "Radio Drama": "Radio",
-    "Radio Show": "Radio",
-    "Actual Play Podcast": "Podcast",
-    "Multimedia Franchise": "Franchise",
-    "Trading Card Game": "Tabletop Game",
-    "Forum Roleplay": "Roleplay",
-    "Fake Gaming News": "Website",
-    "Rant": "Web Video",
-    "Animated Short": "Cartoon Short",
-}
-
-
-def load_database(filename="ai-character-db.json"):
-    """Load the character database."""
-    with open(filename, 'r') as f:
-        return json.load(f)
-
-
-def save_database(data, filename="ai-character-db.json"):
-    """Save the character database."""
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+
+# The ambiguous work type resolutions and the standardization mapping are
+# rules in config/work-type-rules.json (see work_type_rules.py), shared with
+# merge_json_files.py, which applies them while loading.
+
+# Directories --all leaves alone: the configuration, and the output of
+# split_json_by_work_type.py. The split files are generated from
+# ai-character-db.json, along with their compressed copies and the manifest:
+# standardize the database and split again instead.
+SKIPPED_DIRS = ('config', 'data')
 
 
 def get_work_type_stats(data):
@@ -75,33 +59,78 @@ def get_work_type_stats(data):
     return work_types
 
 
-def fix_ambiguous_entries(data, resolutions=AMBIGUOUS_RESOLUTIONS):
-    """Fix ambiguous work types like 'Manga/Anime'."""
-    changes = []
+def entry_needs_change(entry, normalizer):
+    """Check whether standardizing an entry would change its work type."""
+    return normalizer.resolve(entry['work_type'], entry.get('work_name'),
+                              entry.get('character_name'))[1] is not None
+
+
+def file_contains(filename, marker):
+    """Check whether a file contains a byte string, reading it in chunks."""
+    overlap = b''
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            window = overlap + chunk
+            if marker in window:
+                return True
+            overlap = window[-(len(marker) - 1):]
+    return False
 
-    for entry in data['characters']:
-        key = (entry['work_name'], entry['character_name'])
-        if key in resolutions:
-            old_type = entry['work_type']
-            new_type = resolutions[key]
-            entry['work_type'] = new_type
-            changes.append((entry['character_name'], entry['work_name'], old_type, new_type))
 
-    return changes
+def needs_standardization(filename, normalizer):
+    """Fast pre-check: whether process_single_file would change a file.
+
+    A file can be skipped when its metadata already has
+    work_types_standardized and an up-to-date total_entries, and no entry's
+    work type would change. Files without the marker are not parsed at all;
+    otherwise the scan stops at the first entry that needs a change. Anything
+    unexpected (no characters, compact files, invalid JSON, malformed entries)
+    returns True so that process_single_file reports it as usual.
+    """
+    try:
+        if not file_contains(filename, b'"work_types_standardized"'):
+            return True
+
+        stream = CharacterStream(str(filename))
+        for entry in stream:
+            if (stream.header.get('format') == COMPACT_FORMAT
+                    or not isinstance(entry, dict) or 'work_type' not in entry
+                    or entry_needs_change(entry, normalizer)):
+                return True
+        if not stream.has_characters:
+            return True
+
+        header, trailer = stream.header, stream.trailer
+        metadata = header['metadata'] if 'metadata' in header else trailer.get('metadata')
+        return not (isinstance(metadata, dict)
+                    and metadata.get('work_types_standardized') is True
+                    and metadata.get('total_entries') == stream.count)
+    except (OSError, json.JSONDecodeError, UnicodeDecodeError):
+        return True
 
 
-def standardize_work_types(data, mapping=WORK_TYPE_MAPPING):
-    """Apply work type standardization mapping."""
-    changes = Counter()
+def standardize_stream(entries, normalizer, before_stats, after_stats, ambiguous_changes,
+                       mapping_changes):
+    """Standardize entries one at a time, recording stats and changes as they pass.
 
-    for entry in data['characters']:
-        original_type = entry['work_type']
-        if original_type in mapping:
-            new_type = mapping[original_type]
+    Overrides and split rules (ambiguous work types) are recorded in
+    ambiguous_changes, mapping and case/whitespace folding in mapping_changes.
+    """
+    for entry in entries:
+        before_stats[entry['work_type']] += 1
+
+        old_type = entry['work_type']
+        new_type, kind = normalizer.resolve(old_type, entry['work_name'], entry['character_name'])
+        if kind is not None:
             entry['work_type'] = new_type
-            changes[f"{original_type} → {new_type}"] += 1
+            if kind in ('override', 'split'):
+                ambiguous_changes.append((entry['character_name'], entry['work_name'],
+                                          old_type, new_type))
+            else:
+                mapping_changes[f"{old_type} → {new_type}"] += 1
 
-    return changes
+        after_stats[entry['work_type']] += 1
+        yield entry
 
 
 def print_report(before_stats, after_stats, ambiguous_changes, mapping_changes):
@@ -141,6 +170,8 @@ def find_json_files():
     """Find all JSON files in current directory and subdirectories."""
     json_files = []
     for json_file in Path('.').rglob('*.json'):
+        if json_file.parts[0] in SKIPPED_DIRS:
+            continue
         # Skip backup files, hidden directories, and 'old' directory
         if not any(part.startswith('.') for part in json_file.parts):
             if 'backup' not in json_file.name.lower():
@@ -149,29 +180,59 @@ def find_json_files():
     return sorted(json_files)
 
 
-def process_single_file(filename, dry_run=False, no_backup=False):
-    """Process a single JSON file."""
+def process_single_file(filename, dry_run=False, no_backup=False, force=False,
+                        rules_file=DEFAULT_RULES_FILE):
+    """Process a single JSON file.
+
+    Entries are streamed from the file through both standardization steps and
+    into a temporary output file, so memory use does not grow with file size.
+    The original file is only replaced once the whole file has been processed.
+    Work types are standardized with the rules in rules_file. Unless force is
+    set, files that need no changes (see needs_standardization) are skipped
+    without a backup or rewrite.
+    """
     print(f"\n{'='*60}")
     print(f"Processing: {filename}")
     print(f"{'='*60}")
 
+    normalizer = load_rules(rules_file)
+    if not force and not needs_standardization(filename, normalizer):
+        print("✓ Already standardized, no changes needed")
+        return True
+
+    writer = None
     try:
         print("Loading database...")
-        data = load_database(filename)
+        stream = CharacterStream(str(filename))
+        if not dry_run:
+            writer = CharacterWriter(str(filename))
+
+        before_stats = Counter()
+        after_stats = Counter()
+        ambiguous_changes = []
+        mapping_changes = Counter()
+
+        # Only documents with a 'characters' field of entry objects are processed
+        is_compact = lambda: stream.header.get('format') == COMPACT_FORMAT
+        entries = takewhile(lambda entry: stream.has_characters and not is_compact(), stream)
+        for entry in standardize_stream(entries, normalizer, before_stats, after_stats,
+                                        ambiguous_changes, mapping_changes):
+            if writer:
+                writer.write(entry)
 
         # Verify it has the expected structure
-        if 'characters' not in data:
+        if not stream.has_characters:
             print(f"⚠️  Skipping {filename}: No 'characters' field found")
             return False
+        if is_compact():
+            print(f"⚠️  Skipping {filename}: Compact work type file "
+                  f"(standardize ai-character-db.json and re-run split_json_by_work_type.py)")
+            return False
 
-        print(f"Loaded {len(data['characters'])} entries")
-
-        # Get before stats
-        before_stats = get_work_type_stats(data)
+        print(f"Loaded {stream.count} entries")
 
         # Step 1: Fix ambiguous entries
         print("\nStep 1: Fixing ambiguous entries...")
-        ambiguous_changes = fix_ambiguous_entries(data)
         if ambiguous_changes:
             print(f"Fixed {len(ambiguous_changes)} ambiguous entries")
         else:
@@ -179,36 +240,36 @@ def process_single_file(filename, dry_run=False, no_backup=False):
 
         # Step 2: Apply standardization mapping
         print("\nStep 2: Applying standardization mapping...")
-        mapping_changes = standardize_work_types(data)
         if mapping_changes:
             print(f"Modified {sum(mapping_changes.values())} entries")
         else:
             print("No mapping changes needed")
 
-        # Get after stats
-        after_stats = get_work_type_stats(data)
-
         # Print report
         print_report(before_stats, after_stats, ambiguous_changes, mapping_changes)
 
         # Save results
         if not dry_run:
             print("\nSaving standardized database...")
-            # Update metadata
-            if 'metadata' not in data:
-                data['metadata'] = {}
-            data['metadata']['work_types_standardized'] = True
-            data['metadata']['total_entries'] = len(data['characters'])
+            # Update metadata (a new metadata field goes after the characters)
+            header, trailer = stream.header, stream.trailer
+            if 'metadata' in header:
+                metadata = header['metadata']
+            else:
+                metadata = trailer.setdefault('metadata', {})
+            metadata['work_types_standardized'] = True
+            metadata['total_entries'] = stream.count
 
             # Backup original (unless --no-backup flag is set)
             if not no_backup:
-                import shutil
-                backup_name = str(filename).replace('.json', '-backup.json')
-                shutil.copy(filename, backup_name)
-                print(f"Created backup: {backup_name}")
+                backup, created = backup_file(str(filename))
+                if created:
+                    print(f"Created backup: {backup}")
+                else:
+                    print(f"Backup already stored: {backup}")
 
             # Save standardized version
-            save_database(data, filename)
+            writer.commit(header, trailer)
             print(f"Saved: {filename}")
             print("\n✅ Standardization complete!")
         else:
@@ -222,12 +283,94 @@ def process_single_file(filename, dry_run=False, no_backup=False):
     except Exception as e:
         print(f"⚠️  Error processing {filename}: {e}")
         return False
+    finally:
+        if writer:
+            writer.discard()
+
+
+def process_file_captured(filename, dry_run=False, no_backup=False, force=False,
+                          rules_file=DEFAULT_RULES_FILE):
+    """Run process_single_file in a worker, returning (success, printed report)."""
+    output = io.StringIO()
+    with redirect_stdout(output):
+        success = process_single_file(filename, dry_run, no_backup, force, rules_file)
+    return success, output.getvalue()
+
+
+def process_files(json_files, dry_run=False, no_backup=False, force=False, jobs=1,
+                  rules_file=DEFAULT_RULES_FILE):
+    """Process files with a pool of jobs workers, printing each file's report in order.
+
+    Returns the number of files processed successfully.
+    """
+    if jobs <= 1 or len(json_files) <= 1:
+        return sum(process_single_file(str(json_file), dry_run, no_backup, force, rules_file)
+                   for json_file in json_files)
+
+    successful = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(process_file_captured, str(json_file), dry_run, no_backup,
+                                   force, rules_file)
+                   for json_file in json_files]
+        for future in futures:
+            success, output = future.result()
+            print(output, end="")
+            successful += success
+    return successful
+
+
+def list_file_backups(filenames):
+    """Print the backups of each file, oldest first."""
+    for filename in filenames:
+        backups = list_backups(filename)
+        print(f"{filename}: {len(backups)} backup(s)")
+        for backup in backups:
+            print(f"  • {os.path.basename(backup)} ({os.path.getsize(backup):,} bytes compressed)")
+
+
+def restore_files(filenames, backup=None):
+    """Restore each file from its latest backup, or from the named backup."""
+    for filename in filenames:
+        try:
+            source = restore_file(filename, backup)
+            print(f"Restored {filename} from {source}")
+        except (FileNotFoundError, ValueError) as e:
+            print(f"⚠️  {e}")
 
 
 def main():
-    dry_run = "--dry-run" in sys.argv
-    process_all = "--all" in sys.argv
-    no_backup = "--no-backup" in sys.argv
+    parser = argparse.ArgumentParser(
+        description="Standardize work type names in the character database."
+    )
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Show what would change without modifying files")
+    parser.add_argument("--all", action="store_true",
+                        help="Process all JSON files in current directory and subdirectories, except config/ and data/")
+    parser.add_argument("--no-backup", action="store_true",
+                        help="Don't create backup files before modifying")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of files to process in parallel with --all (default: CPU count)")
+    parser.add_argument("--force", action="store_true",
+                        help="Rewrite files even if they are already standardized")
+    parser.add_argument("--rules", default=DEFAULT_RULES_FILE, metavar="FILE",
+                        help="Work type rules file (default: config/work-type-rules.json)")
+    parser.add_argument("--list-backups", nargs="+", metavar="FILE",
+                        help=f"List the backups of files in {DEFAULT_BACKUP_DIR}/ and exit")
+    parser.add_argument("--restore", nargs="+", metavar="FILE",
+                        help="Restore files from their latest backup (or --backup) and exit")
+    parser.add_argument("--backup", metavar="NAME",
+                        help="Backup to restore: the start of its name, e.g. its timestamp")
+    args = parser.parse_args()
+
+    if args.list_backups:
+        list_file_backups(args.list_backups)
+        return
+    if args.restore:
+        restore_files(args.restore, args.backup)
+        return
+    dry_run = args.dry_run
+    process_all = args.all
+    no_backup = args.no_backup
 
     if dry_run:
         print("DRY RUN MODE - No files will be modified\n")
@@ -251,10 +394,8 @@ def main():
         print("PROCESSING ALL FILES")
         print("="*60)
 
-        successful = 0
-        for json_file in json_files:
-            if process_single_file(str(json_file), dry_run, no_backup):
-                successful += 1
+        successful = process_files(json_files, dry_run, no_backup, args.force, args.jobs,
+                                   args.rules)
 
         print("\n" + "="*60)
         print(f"SUMMARY: Processed {successful}/{len(json_files)} files successfully")
@@ -266,11 +407,13 @@ def main():
             print("\nDRY RUN - Run without --dry-run to apply changes")
     else:
         # Process single file (original behavior)
-        process_single_file("ai-character-db.json", dry_run, no_backup)
+        process_single_file("ai-character-db.json", dry_run, no_backup, args.force, args.rules)
 
         if dry_run:
             print("\nRun without --dry-run to apply changes")
 
+    report_peak_memory()
+
 
 if __name__ == "__main__":
     main()
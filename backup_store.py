@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Content-addressed backup store for files rewritten by the repository scripts.
+
+apply_work_type_standardization.py backs up every file here before
+replacing it. Layout (under .backups/ by default):
+
+    objects/1a/2b3c...ef.gz                     gzip of a file's content,
+                                                named by its SHA-256
+    files/<path>/20261017-120000-1a2b3c4d5e6f.gz   one backup of <path>, relative
+                                                to the working directory
+                                                (files outside it go under
+                                                files/_absolute/<absolute path>)
+
+Each distinct content is compressed and stored only once. The backups of a
+file are hard links to the objects (or small copies of the compressed object
+where hard links are not supported), named by time and content hash, so
+listing a file's backups is a directory listing and backing up content that
+is already stored costs only a directory entry. A file whose latest backup
+already holds its current content is not backed up again.
+
+The leading dot keeps the store out of the JSON file scans of the scripts.
+"""
+
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+from character_stream import CHUNK_SIZE, copy_target_mode, hash_file
+
+# Default location of the backup store
+DEFAULT_BACKUP_DIR = ".backups"
+
+
+def object_path(sha256: str, store: str = DEFAULT_BACKUP_DIR) -> str:
+    """Return the path of the object holding the content with this hash."""
+    return os.path.join(store, "objects", sha256[:2], sha256[2:] + ".gz")
+
+
+def backups_dir(file_path: str, store: str = DEFAULT_BACKUP_DIR) -> str:
+    """Return the directory holding the backups of a file.
+
+    Files are keyed by their path relative to the working directory. Files
+    outside it are keyed by their absolute path under "_absolute", so no
+    backup is ever written outside the store.
+    """
+    relative = os.path.relpath(os.path.abspath(file_path))
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        drive, path = os.path.splitdrive(os.path.abspath(file_path))
+        relative = os.path.join("_absolute", drive.rstrip(":"), path.lstrip(os.sep))
+    return os.path.join(store, "files", relative)
+
+
+def list_backups(file_path: str, store: str = DEFAULT_BACKUP_DIR) -> List[str]:
+    """Return the backups of a file, oldest first."""
+    directory = backups_dir(file_path, store)
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.endswith(".gz")]
+
+
+def backup_sha256(backup: str) -> str:
+    """Return the (abbreviated) content hash recorded in a backup's name."""
+    return os.path.basename(backup)[:-len(".gz")].rsplit("-", 1)[-1]
+
+
+def store_object(file_path: str, sha256: str, store: str = DEFAULT_BACKUP_DIR) -> bool:
+    """Compress a file into the object store unless its content is already there.
+
+    Returns True if a new object was written.
+    """
+    target = object_path(sha256, store)
+    if os.path.exists(target):
+        return False
+
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as raw, open(file_path, 'rb') as source:
+            # mtime=0 keeps objects of the same content byte-identical
+            with gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) as compressed:
+                shutil.copyfileobj(source, compressed, CHUNK_SIZE)
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return True
+
+
+def backup_file(file_path: str, store: str = DEFAULT_BACKUP_DIR) -> Tuple[str, bool]:
+    """Back up a file's current content.
+
+    Returns (backup path, created). created is False if the latest backup of
+    the file already holds this content, in which case that backup is returned.
+    """
+    sha256 = hash_file(file_path)
+    existing = list_backups(file_path, store)
+    if existing and sha256.startswith(backup_sha256(existing[-1])):
+        return existing[-1], False
+
+    store_object(file_path, sha256, store)
+
+    directory = backups_dir(file_path, store)
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    backup = os.path.join(directory, f"{stamp}-{sha256[:12]}.gz")
+    if not os.path.exists(backup):
+        try:
+            os.link(object_path(sha256, store), backup)
+        except OSError:
+            shutil.copyfile(object_path(sha256, store), backup)
+    return backup, True
+
+
+def restore_file(file_path: str, backup: Optional[str] = None,
+                 store: str = DEFAULT_BACKUP_DIR) -> str:
+    """Restore a file from a backup (by default its latest one).
+
+    backup may be a path returned by list_backups or the start of a backup's
+    name (e.g. its timestamp). The file is replaced atomically, and only after
+    the restored content was checked against the hash in the backup's name.
+    Returns the backup used. Raises FileNotFoundError if there is no matching
+    backup and ValueError if the backup is damaged.
+    """
+    backups = list_backups(file_path, store)
+    if backup is not None:
+        if os.path.exists(backup):
+            backups = [backup]
+        else:
+            backups = [path for path in backups if os.path.basename(path).startswith(backup)]
+    if not backups:
+        raise FileNotFoundError(f"No backup of {file_path} found in {store}")
+    source = backups[-1]
+
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(
+        prefix='.' + os.path.basename(file_path) + '.', suffix='.tmp', dir=directory)
+    try:
+        digest = hashlib.sha256()
+        with os.fdopen(fd, 'wb') as target, gzip.open(source, 'rb') as compressed:
+            for chunk in iter(lambda: compressed.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                target.write(chunk)
+        if not digest.hexdigest().startswith(backup_sha256(source)):
+            raise ValueError(f"Backup {source} does not match its content hash")
+        copy_target_mode(temp_path, file_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return source
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+SQLite storage backend for the character database (stdlib sqlite3).
+
+merge_json_files.py --sqlite writes every output document (ai-character-db.json,
+incomplete-entries.json, ...) into one SQLite file, and the JSON files are
+then exported from it. Other scripts can look up and update single entries
+through the indexes instead of parsing and rewriting a whole JSON file.
+
+Each entry is stored losslessly as its JSON text, in document order, next to
+indexed copies of work_type, work_name, character_name and the three
+ratings. An FTS5 table indexes the names, description and explanations for
+full-text search.
+
+Usage:
+    python3 character_db.py export [--db PATH] [--data-dir DIR]
+    python3 character_db.py search QUERY [--db PATH] [--limit N]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from character_record import json_default
+from character_stream import CharacterWriter
+
+
+DEFAULT_DB_FILE = "ai-character-db.sqlite"
+MAIN_DOCUMENT = "ai-character-db.json"
+
+# Copied into indexed columns (stripped, like the keys used to match entries)
+INDEXED_FIELDS = (
+    "work_type",
+    "work_name",
+    "character_name",
+    "ai_qualification",
+    "benevolence_rating",
+    "alignment_rating",
+)
+
+# Indexed for full-text search
+TEXT_FIELDS = (
+    "character_name",
+    "work_name",
+    "character_description",
+    "ai_qualification_explanation",
+    "benevolence_rating_explanation",
+    "alignment_rating_explanation",
+)
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    header TEXT NOT NULL,
+    trailer TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS characters (
+    id INTEGER PRIMARY KEY,
+    document TEXT NOT NULL REFERENCES documents(name),
+    position INTEGER NOT NULL,
+    work_type TEXT,
+    work_name TEXT,
+    character_name TEXT,
+    ai_qualification TEXT,
+    benevolence_rating TEXT,
+    alignment_rating TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS characters_document ON characters(document, position);
+CREATE INDEX IF NOT EXISTS characters_work_type ON characters(work_type);
+CREATE INDEX IF NOT EXISTS characters_work_name ON characters(work_name, character_name);
+CREATE INDEX IF NOT EXISTS characters_character_name ON characters(character_name);
+CREATE INDEX IF NOT EXISTS characters_ai_qualification ON characters(ai_qualification);
+CREATE INDEX IF NOT EXISTS characters_benevolence_rating ON characters(benevolence_rating);
+CREATE INDEX IF NOT EXISTS characters_alignment_rating ON characters(alignment_rating);
+"""
+
+
+def _extract(row: str) -> str:
+    return ", ".join(f"json_extract({row}.data, '$.{field}')" for field in TEXT_FIELDS)
+
+
+_columns = ", ".join(TEXT_FIELDS)
+
+# The FTS table reads its text straight out of the stored JSON (external
+# content), so descriptions are not stored twice. Triggers keep it in sync.
+FTS_SQL = f"""
+CREATE VIEW IF NOT EXISTS character_text AS
+    SELECT id, {", ".join(f"json_extract(data, '$.{field}') AS {field}" for field in TEXT_FIELDS)}
+    FROM characters;
+CREATE VIRTUAL TABLE IF NOT EXISTS character_search USING fts5(
+    {_columns}, content='character_text', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS characters_search_insert AFTER INSERT ON characters BEGIN
+    INSERT INTO character_search(rowid, {_columns}) VALUES (new.id, {_extract("new")});
+END;
+CREATE TRIGGER IF NOT EXISTS characters_search_delete AFTER DELETE ON characters BEGIN
+    INSERT INTO character_search(character_search, rowid, {_columns})
+        VALUES ('delete', old.id, {_extract("old")});
+END;
+CREATE TRIGGER IF NOT EXISTS characters_search_update AFTER UPDATE OF data ON characters BEGIN
+    INSERT INTO character_search(character_search, rowid, {_columns})
+        VALUES ('delete', old.id, {_extract("old")});
+    INSERT INTO character_search(rowid, {_columns}) VALUES (new.id, {_extract("new")});
+END;
+"""
+
+
+def _index_value(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (list, dict)):
+        # Malformed entries (kept in the invalid and incomplete documents)
+        # can hold values SQLite cannot bind; index them as their JSON text
+        return json.dumps(value, ensure_ascii=False, default=json_default)
+    return value
+
+
+def _row_values(entry: Dict[str, Any]) -> Tuple[Any, ...]:
+    """The indexed columns and JSON text of an entry, in column order."""
+    return tuple(_index_value(entry.get(field)) for field in INDEXED_FIELDS) + (
+        json.dumps(entry, ensure_ascii=False, default=json_default),)
+
+
+def connect(db_file: str = DEFAULT_DB_FILE) -> sqlite3.Connection:
+    """Open (creating if needed) a character database.
+
+    Full-text search is set up only if this SQLite build includes FTS5;
+    everything else works without it.
+    """
+    conn = sqlite3.connect(db_file)
+    conn.executescript(SCHEMA_SQL)
+    try:
+        conn.executescript(FTS_SQL)
+    except sqlite3.OperationalError as e:
+        if "fts5" not in str(e):
+            raise
+        print(f"Warning: SQLite has no FTS5 support, full-text search is disabled ({e})")
+    return conn
+
+
+def has_search(conn: sqlite3.Connection) -> bool:
+    """Check whether the database has the full-text search table."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'character_search'").fetchone() is not None
+
+
+def write_document(conn: sqlite3.Connection, name: str, entries: List[Dict[str, Any]],
+                   header: Dict[str, Any], trailer: Optional[Dict[str, Any]] = None):
+    """Replace a document (e.g. "ai-character-db.json") with the given entries, and commit."""
+    with conn:
+        conn.execute("DELETE FROM characters WHERE document = ?", (name,))
+        conn.execute(
+            "INSERT OR REPLACE INTO documents(name, header, trailer) VALUES (?, ?, ?)",
+            (name, json.dumps(header, ensure_ascii=False), json.dumps(trailer or {}, ensure_ascii=False)))
+        conn.executemany(
+            f"INSERT INTO characters(document, position, {', '.join(INDEXED_FIELDS)}, data) "
+            f"VALUES (?, ?, {', '.join('?' for _ in INDEXED_FIELDS)}, ?)",
+            ((name, position) + _row_values(entry) for position, entry in enumerate(entries)))
+
+
+def document_names(conn: sqlite3.Connection) -> List[str]:
+    return [row[0] for row in conn.execute("SELECT name FROM documents ORDER BY name")]
+
+
+def read_document_info(conn: sqlite3.Connection, name: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Return a document's (header, trailer), the top-level keys around "characters"."""
+    row = conn.execute("SELECT header, trailer FROM documents WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        raise KeyError(f"No document {name!r} in the database")
+    return json.loads(row[0]), json.loads(row[1])
+
+
+def iter_document(conn: sqlite3.Connection, name: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (row id, entry) for every entry of a document, in document order."""
+    for row_id, data in conn.execute(
+            "SELECT id, data FROM characters WHERE document = ? ORDER BY position", (name,)):
+        yield row_id, json.loads(data)
+
+
+def load_document(conn: sqlite3.Connection, name: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Return a document's metadata and its entries, in document order."""
+    header, trailer = read_document_info(conn, name)
+    metadata = header.get("metadata", trailer.get("metadata", {}))
+    return metadata, [entry for _, entry in iter_document(conn, name)]
+
+
+def count_entries(conn: sqlite3.Connection, name: str) -> int:
+    return conn.execute("SELECT COUNT(*) FROM characters WHERE document = ?", (name,)).fetchone()[0]
+
+
+def get_entry(conn: sqlite3.Connection, row_id: int) -> Dict[str, Any]:
+    """Return the entry stored with the given row id."""
+    row = conn.execute("SELECT data FROM characters WHERE id = ?", (row_id,)).fetchone()
+    if row is None:
+        raise KeyError(f"No entry with id {row_id}")
+    return json.loads(row[0])
+
+
+def find_entries(conn: sqlite3.Connection, name: str, work_type: str, work_name: str,
+                 character_name: str) -> List[Tuple[int, Dict[str, Any]]]:
+    """Look up a document's entries by their (stripped) work type, work name and character name.
+
+    Returns (row id, entry) pairs in document order.
+    """
+    rows = conn.execute(
+        "SELECT id, data FROM characters WHERE work_name = ? AND character_name = ? "
+        "AND work_type = ? AND document = ? ORDER BY position",
+        (work_name, character_name, work_type, name))
+    return [(row_id, json.loads(data)) for row_id, data in rows]
+
+
+def update_entry(conn: sqlite3.Connection, row_id: int, entry: Dict[str, Any]):
+    """Replace the stored entry with the given row id."""
+    conn.execute(
+        f"UPDATE characters SET {', '.join(f'{field} = ?' for field in INDEXED_FIELDS)}, data = ? "
+        f"WHERE id = ?",
+        _row_values(entry) + (row_id,))
+
+
+def delete_entries(conn: sqlite3.Connection, row_ids: List[int]):
+    """Delete entries by row id. Later entries keep their relative order."""
+    conn.executemany("DELETE FROM characters WHERE id = ?", ((row_id,) for row_id in row_ids))
+
+
+def export_document(conn: sqlite3.Connection, name: str, filename: Optional[str] = None) -> int:
+    """Write a document out as JSON (to a file named after it by default).
+
+    The output is exactly what the scripts writing the JSON directly would
+    produce. If the header metadata has a "total_entries" count, it is set
+    to the number of entries exported. Returns that number.
+    """
+    header, trailer = read_document_info(conn, name)
+    count = count_entries(conn, name)
+    for section in (header, trailer):
+        if "total_entries" in section.get("metadata", {}):
+            section["metadata"]["total_entries"] = count
+
+    with CharacterWriter(filename or name, header=header) as writer:
+        writer.write_all(entry for _, entry in iter_document(conn, name))
+        writer.commit(trailer=trailer)
+    return count
+
+
+def search(conn: sqlite3.Connection, query: str, name: str = MAIN_DOCUMENT,
+           limit: int = 20) -> List[Dict[str, Any]]:
+    """Full-text search over names, descriptions and explanations, best matches first.
+
+    `query` uses FTS5 syntax, e.g. 'benevolent AND ship' or 'character_name: hal'.
+    """
+    rows = conn.execute(
+        "SELECT characters.data FROM character_search "
+        "JOIN characters ON characters.id = character_search.rowid "
+        "WHERE character_search MATCH ? AND characters.document = ? "
+        "ORDER BY character_search.rank LIMIT ?",
+        (query, name, limit))
+    return [json.loads(data) for data, in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or search the SQLite character database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export every document to JSON and split the main one")
+    export_parser.add_argument("--db", default=DEFAULT_DB_FILE, help=f"Database file (default: {DEFAULT_DB_FILE})")
+    export_parser.add_argument("--data-dir", default="data", help="Directory for the work type files (default: data)")
+
+    search_parser = subparsers.add_parser("search", help="Full-text search of the main database")
+    search_parser.add_argument("query", help="FTS5 query, e.g. 'benevolent AND ship'")
+    search_parser.add_argument("--db", default=DEFAULT_DB_FILE, help=f"Database file (default: {DEFAULT_DB_FILE})")
+    search_parser.add_argument("--limit", type=int, default=20, help="Maximum results (default: 20)")
+
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} not found (create it with merge_json_files.py --sqlite)")
+    conn = connect(args.db)
+
+    if args.command == "export":
+        from split_json_by_work_type import split_json_by_work_type
+
+        for name in document_names(conn):
+            count = export_document(conn, name)
+            print(f"Exported {count} entries to {name}")
+        if MAIN_DOCUMENT in document_names(conn):
+            split_json_by_work_type(output_dir=args.data_dir, db_file=args.db)
+    else:
+        if not has_search(conn):
+            parser.error("this database has no full-text search table (SQLite without FTS5)")
+        for i, entry in enumerate(search(conn, args.query, limit=args.limit), 1):
+            print(f"{i}. {entry.get('character_name')} from {entry.get('work_name')} ({entry.get('work_type')})")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
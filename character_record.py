@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory representation of character entries.
+
+A plain dict per entry costs several hundred bytes before counting its
+values, and every entry carries its own copy of strings such as "Video Game",
+"Malevolent" or the TVTropes page URL it came from. CharacterRecord stores
+the schema fields in slots and shares every repeated string:
+
+- Categorical fields (work_type, work_name, character_type and the three
+  ratings) and work_url are interned, so each distinct value exists once
+- source_urls is a tuple of URLs drawn from one shared URL table
+- The field order of each record is a tuple shared by all records with
+  the same layout, so to_dict() reproduces the original key order
+
+Records behave like the dicts they replace (get, [], in, keys, items, copy,
+assignment), so the merge pipeline functions accept either, and
+to_dict()/from_dict() round-trip any entry without loss, including fields
+outside the schema.
+"""
+
+import sys
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# Schema fields stored in slots (see SCHEMA in merge_json_files.py)
+RECORD_FIELDS = (
+    "source_urls",
+    "work_url",
+    "work_type",
+    "work_name",
+    "publication_year",
+    "character_type",
+    "character_name",
+    "character_description",
+    "ai_qualification",
+    "ai_qualification_explanation",
+    "benevolence_rating",
+    "benevolence_rating_explanation",
+    "alignment_rating",
+    "alignment_rating_explanation",
+    "needs_research",
+)
+_RECORD_FIELD_SET = frozenset(RECORD_FIELDS)
+
+# Fields whose values repeat across many entries and are shared
+INTERNED_FIELDS = frozenset({
+    "work_url",
+    "work_type",
+    "work_name",
+    "character_type",
+    "ai_qualification",
+    "benevolence_rating",
+    "alignment_rating",
+})
+
+_ABSENT = object()
+
+# Shared key-order tuples, one per distinct entry layout
+_layouts: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+class UrlTable:
+    """Table of distinct URLs shared by all records."""
+
+    def __init__(self):
+        self._urls: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def share(self, url: Any) -> Any:
+        """Return the table's copy of a URL, adding it if new."""
+        if type(url) is not str:
+            return url
+        return self._urls.setdefault(url, url)
+
+    def share_all(self, urls: Any) -> Any:
+        """Return a list of URLs as a tuple of shared URL strings."""
+        if type(urls) is not list:
+            return urls
+        share = self._urls.setdefault
+        return tuple(share(url, url) if type(url) is str else url for url in urls)
+
+
+URL_TABLE = UrlTable()
+
+
+def _share_layout(keys: Tuple[str, ...]) -> Tuple[str, ...]:
+    return _layouts.setdefault(keys, keys)
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+# How each field's JSON value is converted to its stored form (None: kept as is)
+_PACKERS = {field: None for field in RECORD_FIELDS}
+_PACKERS.update({field: _intern for field in INTERNED_FIELDS})
+_PACKERS["work_url"] = URL_TABLE.share
+_PACKERS["source_urls"] = URL_TABLE.share_all
+
+
+class CharacterRecord(MutableMapping):
+    """A character entry stored compactly, usable wherever an entry dict is.
+
+    Schema fields live in slots (an unset slot is an absent field), any other
+    fields in a small dict, and the key order in a shared tuple. source_urls
+    is stored as a tuple and handed out as a fresh list, so callers cannot
+    change a record by mutating a value they read from it.
+    """
+
+    __slots__ = RECORD_FIELDS + ("_order", "_extra")
+
+    def __init__(self, entry: Optional[Dict[str, Any]] = None):
+        self._order: Tuple[str, ...] = ()
+        self._extra: Optional[Dict[str, Any]] = None
+        if not entry:
+            return
+
+        for key, value in entry.items():
+            setter = _SETTERS.get(key)
+            if setter is not None:
+                setter(self, value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[key] = value
+        self._order = _share_layout(tuple(entry))
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, Any]) -> "CharacterRecord":
+        """Build a record from an entry dict."""
+        return cls(entry)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the entry as a plain dict, with the original key order."""
+        return {key: self[key] for key in self._order}
+
+    def copy(self) -> Dict[str, Any]:
+        """Return a plain dict copy, like dict.copy() on an entry."""
+        return self.to_dict()
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _PACKERS:
+            value = getattr(self, key, _ABSENT)
+            if value is _ABSENT:
+                raise KeyError(key)
+            if key == "source_urls" and type(value) is tuple:
+                return list(value)
+            return value
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _PACKERS:
+            value = getattr(self, key, default)
+            if key == "source_urls" and type(value) is tuple:
+                return list(value)
+            return value
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __setitem__(self, key: str, value: Any):
+        setter = _SETTERS.get(key)
+        if setter is not None:
+            present = hasattr(self, key)
+            setter(self, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            present = key in self._extra
+            self._extra[key] = value
+        if not present:
+            self._order = _share_layout(self._order + (key,))
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        if key in _PACKERS:
+            delattr(self, key)
+        else:
+            del self._extra[key]
+        self._order = _share_layout(tuple(k for k in self._order if k != key))
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._order
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __repr__(self) -> str:
+        return f"CharacterRecord({self.to_dict()!r})"
+
+    def __reduce__(self):
+        return (CharacterRecord.from_dict, (self.to_dict(),))
+
+
+def _make_setter(field: str):
+    store = CharacterRecord.__dict__[field].__set__
+    pack = _PACKERS[field]
+    if pack is None:
+        return store
+    return lambda record, value: store(record, pack(value))
+
+
+_SETTERS = {field: _make_setter(field) for field in RECORD_FIELDS}
+
+
+def compact_entries(entries: Iterable[Dict[str, Any]]) -> List[CharacterRecord]:
+    """Convert entry dicts into records."""
+    return [CharacterRecord.from_dict(entry) for entry in entries]
+
+
+def json_default(value: Any) -> Any:
+    """`default=` hook letting json.dump(s) serialize records as plain objects."""
+    if isinstance(value, CharacterRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Streaming reader and writer for character database JSON files.
+
+Files in this project are either a {"metadata": ..., "characters": [...]}
+document or a bare list of character entries. CharacterStream yields the
+entries one at a time without ever holding the whole document in memory,
+and CharacterWriter writes the same document layout one entry at a time.
+The writer's output is byte-for-byte what json.dump(data, indent=2)
+produces for the same data, so files rewritten through it do not churn.
+
+All writes go to a temporary file that atomically replaces the target, so
+readers never see a half-written file, and a target that already holds
+the new content is left untouched. write_atomic does the same for content
+held in memory, and run_concurrently writes several files from threads.
+hash_file gives the SHA-256 of a file without reading it into memory.
+"""
+
+import filecmp
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from character_record import json_default
+
+
+CHUNK_SIZE = 64 * 1024
+
+# Threads used by run_concurrently unless told otherwise
+WRITE_THREADS = 8
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# The process umask, read once (os.umask can only be read by setting it)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+_decoder = json.JSONDecoder()
+
+
+class _Scanner:
+    """Buffered tokenizer over a text file that decodes one JSON value at a time.
+
+    Only the value currently being decoded is kept in the buffer. When a value
+    runs past the end of the buffer, more text is read (doubling the read size
+    each time) and decoding is retried, so large values cost amortized linear time.
+    """
+
+    def __init__(self, f, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Read more text into the buffer. Returns False at end of file."""
+        if self.eof:
+            return False
+        if self.pos:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        chunk = self.f.read(max(self.chunk_size, len(self.buf)))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character ('' at end of file)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def take(self, expected: str) -> str:
+        """Consume the next character, which must be one of `expected`."""
+        ch = self.peek()
+        if not ch or ch not in expected:
+            raise json.JSONDecodeError(
+                f"Expecting one of {expected!r}", self.buf, self.pos)
+        self.pos += 1
+        return ch
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        if not self.peek():
+            raise json.JSONDecodeError("Expecting value", self.buf, self.pos)
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+                # A value ending exactly at the buffer edge may be a truncated number
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+class CharacterStream:
+    """Iterate over the character entries of a JSON file with bounded memory.
+
+    Accepts the same layouts as merge_json_files.py: a document with a
+    "characters" array, or a top-level list of entries. Other top-level
+    values of a document (such as "metadata") are collected as they are
+    passed, in `header` if they come before the "characters" array and in
+    `trailer` if they come after it. Malformed JSON raises json.JSONDecodeError.
+
+    Attributes:
+        header: Top-level keys before "characters", in file order
+        trailer: Top-level keys after "characters", in file order
+        has_characters: True once a document's "characters" array is reached
+        count: Number of entries yielded so far
+    """
+
+    def __init__(self, filename: str, chunk_size: int = CHUNK_SIZE):
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.header: Dict[str, Any] = {}
+        self.trailer: Dict[str, Any] = {}
+        self.has_characters = False
+        self.count = 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            scanner = _Scanner(f, self.chunk_size)
+            first = scanner.peek()
+
+            if first == '[':
+                scanner.pos += 1
+                yield from self._array(scanner)
+            elif first == '{':
+                scanner.pos += 1
+                yield from self._document(scanner)
+            else:
+                # Scalars hold no entries, but must still be valid JSON
+                scanner.value()
+
+            if scanner.peek():
+                raise json.JSONDecodeError("Extra data", scanner.buf, scanner.pos)
+
+    def _document(self, scanner: _Scanner) -> Iterator[Dict[str, Any]]:
+        if scanner.peek() == '}':
+            scanner.pos += 1
+            return
+
+        while True:
+            key = scanner.value()
+            if not isinstance(key, str):
+                raise json.JSONDecodeError(
+                    "Expecting property name enclosed in double quotes",
+                    scanner.buf, scanner.pos)
+            scanner.take(':')
+
+            if key == "characters" and scanner.peek() == '[':
+                scanner.pos += 1
+                self.has_characters = True
+                yield from self._array(scanner)
+            elif self.has_characters:
+                self.trailer[key] = scanner.value()
+            else:
+                self.header[key] = scanner.value()
+
+            if scanner.take(',}') == '}':
+                return
+
+    def _array(self, scanner: _Scanner) -> Iterator[Dict[str, Any]]:
+        if scanner.peek() == ']':
+            scanner.pos += 1
+            return
+
+        while True:
+            entry = scanner.value()
+            self.count += 1
+            yield entry
+            if scanner.take(',]') == ']':
+                return
+
+
+def iter_characters(filename: str) -> Iterator[Dict[str, Any]]:
+    """Yield the character entries of a JSON file one at a time."""
+    return iter(CharacterStream(filename))
+
+
+def _dump_nested(value: Any, prefix: str, ensure_ascii: bool) -> str:
+    """Serialize a value as json.dump(indent=2) would at the given nesting prefix.
+
+    CharacterRecord entries are written as the dicts they were built from.
+    """
+    return json.dumps(value, indent=2, ensure_ascii=ensure_ascii,
+                      default=json_default).replace('\n', '\n' + prefix)
+
+
+def copy_target_mode(temp_path: str, target: str):
+    """Give a temporary file the permissions its target should end up with.
+
+    mkstemp creates files readable only by their owner. A file replacing an
+    existing target keeps that target's mode; a new file gets the mode
+    open() would have given it (0666 less the umask).
+    """
+    try:
+        shutil.copymode(target, temp_path)
+    except FileNotFoundError:
+        os.chmod(temp_path, 0o666 & ~_UMASK)
+
+
+class CharacterWriter:
+    """Write a character document to disk one entry at a time.
+
+    If the header (the top-level keys written before "characters", usually
+    just "metadata") is known up front, entries go straight to a temporary
+    file next to the target. Otherwise they are spooled to a scratch file and
+    the header is supplied to commit(), e.g. once the entry count is known.
+    Keys that belong after the "characters" array can be passed to commit()
+    as a trailer.
+    Nothing at `filename` changes until commit(), which atomically replaces it
+    (or leaves it untouched if it already holds the same content; `changed`
+    tells which). Leaving the `with` block without committing discards the
+    output.
+    """
+
+    def __init__(self, filename: str, header: Optional[Dict[str, Any]] = None,
+                 ensure_ascii: bool = False):
+        self.filename = filename
+        self.ensure_ascii = ensure_ascii
+        self.count = 0
+        self.changed = False
+        self._header_written = header is not None
+        self._committed = False
+
+        directory = os.path.dirname(os.path.abspath(filename))
+        fd, self._temp_path = tempfile.mkstemp(
+            prefix='.' + os.path.basename(filename) + '.', suffix='.tmp', dir=directory)
+        self._out = os.fdopen(fd, 'w', encoding='utf-8')
+
+        if header is not None:
+            self._entries = self._out
+            self._write_header(header)
+        else:
+            self._entries = tempfile.TemporaryFile('w+', encoding='utf-8')
+
+    def _write_header(self, header: Dict[str, Any]):
+        self._out.write('{')
+        for key, value in header.items():
+            self._out.write('\n  ' + json.dumps(key, ensure_ascii=self.ensure_ascii) + ': ')
+            self._out.write(_dump_nested(value, '  ', self.ensure_ascii) + ',')
+        self._out.write('\n  "characters": ')
+
+    def write(self, entry: Dict[str, Any]):
+        """Append one entry to the "characters" array."""
+        self._entries.write('[' if self.count == 0 else ',')
+        self._entries.write('\n    ' + _dump_nested(entry, '    ', self.ensure_ascii))
+        self.count += 1
+
+    def write_all(self, entries: Iterable[Dict[str, Any]]):
+        """Append every entry from an iterable."""
+        for entry in entries:
+            self.write(entry)
+
+    def commit(self, header: Optional[Dict[str, Any]] = None,
+               trailer: Optional[Dict[str, Any]] = None):
+        """Finish the document and move it into place."""
+        if not self._header_written:
+            if header is None:
+                raise ValueError("A header is required when it was not given up front")
+            self._write_header(header)
+            self._entries.seek(0)
+            shutil.copyfileobj(self._entries, self._out)
+            self._entries.close()
+
+        self._out.write('\n  ]' if self.count else '[]')
+        for key, value in (trailer or {}).items():
+            self._out.write(',\n  ' + json.dumps(key, ensure_ascii=self.ensure_ascii) + ': ')
+            self._out.write(_dump_nested(value, '  ', self.ensure_ascii))
+        self._out.write('\n}')
+        self._out.close()
+        if os.path.exists(self.filename) and filecmp.cmp(self._temp_path, self.filename, shallow=False):
+            os.remove(self._temp_path)
+        else:
+            copy_target_mode(self._temp_path, self.filename)
+            os.replace(self._temp_path, self.filename)
+            self.changed = True
+        self._committed = True
+
+    def discard(self):
+        """Drop everything written so far, leaving `filename` untouched."""
+        if self._committed:
+            return
+        if self._entries is not self._out:
+            self._entries.close()
+        self._out.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+        self._committed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.discard()
+        return False
+
+
+def write_characters(filename: str, entries: Iterable[Dict[str, Any]],
+                     header: Callable[[int], Dict[str, Any]], ensure_ascii: bool = False) -> int:
+    """Write entries to a character document and return how many were written.
+
+    `header` is called with the final entry count, so an iterable of unknown
+    length can be written with an accurate "total_entries" in its metadata.
+    """
+    with CharacterWriter(filename, ensure_ascii=ensure_ascii) as writer:
+        writer.write_all(entries)
+        writer.commit(header(writer.count))
+        return writer.count
+
+
+def hash_file(file_path: str) -> str:
+    """Return the SHA-256 hex digest of a file, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_atomic(filename: str, content: Union[str, bytes]) -> bool:
+    """Replace a file with new content unless it already holds exactly that.
+
+    Text is written as UTF-8. The content goes to a temporary file next to
+    the target, which then atomically replaces it. Returns True if written.
+    """
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    try:
+        if os.path.getsize(filename) == len(data):
+            with open(filename, 'rb') as f:
+                if f.read() == data:
+                    return False
+    except FileNotFoundError:
+        pass
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_path = tempfile.mkstemp(
+        prefix='.' + os.path.basename(filename) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        copy_target_mode(temp_path, filename)
+        os.replace(temp_path, filename)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return True
+
+
+def run_concurrently(tasks: List[Callable[[], Any]], max_workers: int = WRITE_THREADS) -> List[Any]:
+    """Run callables in a thread pool and return their results in order.
+
+    Meant for writing many files at once: file I/O and zlib compression
+    release the GIL. The first exception raised by a task (in task order)
+    is re-raised once all tasks have finished.
+    """
+    if max_workers <= 1 or len(tasks) <= 1:
+        return [task() for task in tasks]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as pool:
+        futures = [pool.submit(task) for task in tasks]
+    return [future.result() for future in futures]
+
+
+def peak_memory_mb() -> Optional[float]:
+    """Return this process's peak resident memory in MB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    if os.uname().sysname == 'Darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def report_peak_memory():
+    """Print this process's peak resident memory, if the platform reports it."""
+    peak = peak_memory_mb()
+    if peak is not None:
+        print(f"Peak memory: {peak:.1f} MB")
@@ -4,22 +4,29 @@ Check if any entries in incomplete-entries.json match entries in ai-character-db
 Update ai-character-db.json with any missing fields from incomplete-entries.json.
 
 This script compares entries based on work_type, work_name, and character_name.
-"""
 
-import json
-import sys
+Both files are streamed rather than loaded whole: only the incomplete entries
+and the fields to add are kept in memory, and ai-character-db.json is
+rewritten entry by entry in a second pass.
+
+With --sqlite, both databases are read from and updated in the SQLite
+database written by merge_json_files.py --sqlite instead (by default
+ai-character-db.sqlite): each incomplete entry is looked up by index and only
+the matching rows are changed. Add --export to also re-export the two JSON
+files afterwards.
 
+Usage:
+    python3 check_incomplete_duplicates.py [--dry-run] [--sqlite [DB] [--export]]
+"""
 
-def load_database(filename):
-    """Load a character database."""
-    with open(filename, 'r') as f:
-        return json.load(f)
+import argparse
+import os
 
+import character_db
+from character_stream import CharacterStream, CharacterWriter, report_peak_memory
 
-def save_database(data, filename):
-    """Save a character database."""
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+MAIN_FILE = 'ai-character-db.json'
+INCOMPLETE_FILE = 'incomplete-entries.json'
 
 
 def get_entry_key(entry):
@@ -48,35 +55,94 @@ def compare_entries(main_entry, incomplete_entry):
     return missing_fields
 
 
-def main():
-    dry_run = "--dry-run" in sys.argv
+def load_from_json():
+    """Stream both JSON files.
 
-    if dry_run:
-        print("DRY RUN MODE - No files will be modified\n")
-
-    print("Loading databases...")
+    Returns (incomplete entries by key, incomplete count, main matches, main
+    count), where main matches maps each key found in both to the position of
+    the last main entry with that key (the one a key -> entry mapping would
+    keep) and the fields it is missing.
+    """
+    # Create a mapping of keys to entries in incomplete database
+    incomplete_entries_map = {}
+    incomplete_count = 0
+    for entry in CharacterStream(INCOMPLETE_FILE):
+        key = get_entry_key(entry)
+        incomplete_entries_map[key] = entry
+        incomplete_count += 1
 
-    # Load both databases
-    main_db = load_database('ai-character-db.json')
-    incomplete_db = load_database('incomplete-entries.json')
+    # Stream the main database, keeping only what matches an incomplete entry
+    main_matches = {}
+    main_count = 0
+    for index, entry in enumerate(CharacterStream(MAIN_FILE)):
+        key = get_entry_key(entry)
+        if key in incomplete_entries_map:
+            main_matches[key] = (index, compare_entries(entry, incomplete_entries_map[key]))
+        main_count += 1
 
-    main_entries = main_db.get('characters', [])
-    incomplete_entries = incomplete_db.get('characters', [])
+    return incomplete_entries_map, incomplete_count, main_matches, main_count
 
-    print(f"Main database: {len(main_entries)} entries")
-    print(f"Incomplete database: {len(incomplete_entries)} entries")
 
-    # Create a mapping of keys to entries in main database
-    main_entries_map = {}
-    for entry in main_entries:
-        key = get_entry_key(entry)
-        main_entries_map[key] = entry
+def load_from_sqlite(db, incomplete_row_ids):
+    """Like load_from_json, but main entries are looked up by key in the database.
 
-    # Create a mapping of keys to entries in incomplete database
+    Main matches hold database row ids instead of positions. The row ids of
+    the incomplete entries with each key are collected in incomplete_row_ids.
+    """
     incomplete_entries_map = {}
-    for entry in incomplete_entries:
+    incomplete_count = 0
+    for row_id, entry in character_db.iter_document(db, INCOMPLETE_FILE):
         key = get_entry_key(entry)
         incomplete_entries_map[key] = entry
+        incomplete_row_ids.setdefault(key, []).append(row_id)
+        incomplete_count += 1
+
+    main_matches = {}
+    for key, entry in incomplete_entries_map.items():
+        rows = character_db.find_entries(db, MAIN_FILE, *key)
+        if rows:
+            row_id, main_entry = rows[-1]
+            main_matches[key] = (row_id, compare_entries(main_entry, entry))
+
+    return incomplete_entries_map, incomplete_count, main_matches, character_db.count_entries(db, MAIN_FILE)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fill in missing fields of ai-character-db.json from incomplete-entries.json "
+                    "and remove the duplicates from incomplete-entries.json."
+    )
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Show what would change without modifying anything")
+    parser.add_argument("--sqlite", nargs="?", const=character_db.DEFAULT_DB_FILE, metavar="DB",
+                        help="Read and update both databases in a SQLite database instead "
+                             f"(default database: {character_db.DEFAULT_DB_FILE})")
+    parser.add_argument("--export", action="store_true",
+                        help="With --sqlite, re-export the JSON files from the database afterwards")
+    args = parser.parse_args()
+    dry_run, export = args.dry_run, args.export
+
+    if export and not args.sqlite:
+        parser.error("--export requires --sqlite")
+    if args.sqlite and not os.path.exists(args.sqlite):
+        parser.error(f"{args.sqlite} not found (create it with merge_json_files.py --sqlite)")
+
+    if dry_run:
+        print("DRY RUN MODE - No files will be modified\n")
+
+    print("Loading databases...")
+
+    db = None
+    incomplete_row_ids = {}
+    if args.sqlite:
+        db = character_db.connect(args.sqlite)
+        incomplete_entries_map, incomplete_count, main_matches, main_count = \
+            load_from_sqlite(db, incomplete_row_ids)
+    else:
+        incomplete_entries_map, incomplete_count, main_matches, main_count = load_from_json()
+
+    print(f"Main database: {main_count} entries")
+    print(f"Incomplete database: {incomplete_count} entries")
 
     # Check for duplicates and missing fields
     duplicates = []
@@ -84,22 +150,20 @@ def main():
     total_fields_added = 0
 
     for key in incomplete_entries_map.keys():
-        if key in main_entries_map:
+        if key in main_matches:
             duplicates.append({
                 'work_type': key[0],
                 'work_name': key[1],
                 'character_name': key[2]
             })
 
-            # Compare entries to find missing fields
-            main_entry = main_entries_map[key]
-            incomplete_entry = incomplete_entries_map[key]
-            missing_fields = compare_entries(main_entry, incomplete_entry)
+            # Fields found by comparing the entries while streaming
+            main_index, missing_fields = main_matches[key]
 
             if missing_fields:
                 entries_with_updates.append({
                     'key': key,
-                    'main_entry': main_entry,
+                    'main_index': main_index,
                     'missing_fields': missing_fields
                 })
                 total_fields_added += len(missing_fields)
@@ -145,17 +209,27 @@ def main():
             print("APPLYING UPDATES")
             print("="*60)
 
-            for update in entries_with_updates:
-                main_entry = update['main_entry']
-                missing_fields = update['missing_fields']
-
-                # Add missing fields to main entry
-                for field, value in missing_fields.items():
-                    main_entry[field] = value
-
-            # Save updated database
-            print(f"\nSaving updated ai-character-db.json...")
-            save_database(main_db, 'ai-character-db.json')
+            updates_by_index = {
+                update['main_index']: update['missing_fields'] for update in entries_with_updates
+            }
+
+            if db is not None:
+                # Update just the matching rows
+                print(f"\nUpdating {MAIN_FILE} in {args.sqlite}...")
+                with db:
+                    for row_id, missing_fields in updates_by_index.items():
+                        main_entry = character_db.get_entry(db, row_id)
+                        main_entry.update(missing_fields)
+                        character_db.update_entry(db, row_id, main_entry)
+            else:
+                # Save updated database, adding missing fields to main entries as they stream past
+                print(f"\nSaving updated ai-character-db.json...")
+                main_stream = CharacterStream(MAIN_FILE)
+                with CharacterWriter(MAIN_FILE) as writer:
+                    for index, main_entry in enumerate(main_stream):
+                        main_entry.update(updates_by_index.get(index, {}))
+                        writer.write(main_entry)
+                    writer.commit(main_stream.header, main_stream.trailer)
             print(f"✅ Added {total_fields_added} fields to {len(entries_with_updates)} entries")
         else:
             print("\n" + "="*60)
@@ -173,31 +247,49 @@ def main():
         # Get set of duplicate keys
         duplicate_keys = set()
         for key in incomplete_entries_map.keys():
-            if key in main_entries_map:
+            if key in main_matches:
                 duplicate_keys.add(key)
 
-        # Filter out duplicate entries
-        original_count = len(incomplete_entries)
-        incomplete_entries_filtered = []
-        for entry in incomplete_entries:
-            key = get_entry_key(entry)
-            if key not in duplicate_keys:
-                incomplete_entries_filtered.append(entry)
-
-        # Update the incomplete database
-        incomplete_db['characters'] = incomplete_entries_filtered
-
-        # Update metadata if it exists
-        if 'metadata' in incomplete_db:
-            incomplete_db['metadata']['total_entries'] = len(incomplete_entries_filtered)
-
-        # Save updated incomplete database
+        # Filter out duplicate entries and save the updated incomplete database
         print(f"\nRemoving {len(duplicates)} duplicate entries from incomplete-entries.json...")
-        save_database(incomplete_db, 'incomplete-entries.json')
-        print(f"✅ Removed {original_count - len(incomplete_entries_filtered)} entries")
-        print(f"   Incomplete entries remaining: {len(incomplete_entries_filtered)}")
+        if db is not None:
+            row_ids = [row_id for key in duplicate_keys for row_id in incomplete_row_ids[key]]
+            with db:
+                character_db.delete_entries(db, row_ids)
+            removed = len(row_ids)
+            remaining = incomplete_count - removed
+        else:
+            incomplete_stream = CharacterStream(INCOMPLETE_FILE)
+            with CharacterWriter(INCOMPLETE_FILE) as writer:
+                for entry in incomplete_stream:
+                    key = get_entry_key(entry)
+                    if key not in duplicate_keys:
+                        writer.write(entry)
+
+                # Update metadata if it exists
+                for section in (incomplete_stream.header, incomplete_stream.trailer):
+                    if 'metadata' in section:
+                        section['metadata']['total_entries'] = writer.count
+
+                writer.commit(incomplete_stream.header, incomplete_stream.trailer)
+            removed = incomplete_stream.count - writer.count
+            remaining = writer.count
+
+        print(f"✅ Removed {removed} entries")
+        print(f"   Incomplete entries remaining: {remaining}")
+
+    if db is not None:
+        if export and not dry_run:
+            for name in (MAIN_FILE, INCOMPLETE_FILE):
+                count = character_db.export_document(db, name)
+                print(f"Exported {count} entries to {name}")
+        elif not dry_run:
+            print(f"\nThe JSON files were not changed. Run with --export, or "
+                  f"'python3 character_db.py export --db {args.sqlite}', to refresh them.")
+        db.close()
 
     print("\n" + "="*60)
+    report_peak_memory()
 
 
 if __name__ == "__main__":
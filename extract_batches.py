@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Run an extractor over every TVTropes batch that has no extraction result yet.
+
+Usage:
+    python3 extract_batches.py --extractor CMD [PATH ...] [-j N] [--retries N]
+                               [--retry-delay S] [--timeout S] [--keep-invalid]
+                               [--skip-failed] [--list] [--state FILE]
+
+The pending queue is built from the batch tree: a batch
+(batches/<page>/<page>-batch_*.html) is pending if it has no .json result
+next to it, or if this script produced its result from a batch whose content
+has changed since. CMD is run once per pending batch, in up to N batches at
+a time; {input} in it is replaced by the batch file and {output} by the file
+the result must be written to (without {output}, the command's stdout is the
+result). For example:
+
+    python3 extract_batches.py --extractor "python3 stub_extractor.py {input} {output}"
+
+Each result is checked with the merge schema checks (merge_json_files.py)
+as soon as it lands and only then moved into place as <batch>.json, so an
+interrupted or failed extraction never leaves a partial result. A failed
+attempt (non-zero exit, timeout, malformed JSON or entries with violations)
+is retried after a delay that doubles with every retry.
+
+Progress is recorded in batches/.extraction-state.json after every batch:
+when each result was produced, from which batch content, with how many
+entries and attempts, and the last error of every failed batch. Interrupting
+the script and running it again resumes with the batches still pending. The
+leading dot keeps the state out of the "*.json" scans of the other scripts.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from character_stream import CharacterStream, write_atomic
+from merge_json_files import validate_entry
+
+BATCH_DIR = "batches"
+STATE_FILE = os.path.join(BATCH_DIR, ".extraction-state.json")
+
+# Batches extracted at a time unless told otherwise. Extraction waits on the
+# backend rather than the CPU, so this is bounded by what the backend allows.
+DEFAULT_JOBS = 4
+
+# Set when the run is interrupted, so workers stop retrying
+_stopping = threading.Event()
+
+
+def find_batches(paths):
+    """Expand the given batch files and directories into a sorted list of batches."""
+    batches = []
+    for path in paths:
+        if os.path.isdir(path):
+            batches.extend(glob.glob(os.path.join(path, "**", "*-batch_*.html"), recursive=True))
+        else:
+            batches.append(path)
+    return sorted(set(os.path.normpath(batch) for batch in batches))
+
+
+def result_path(batch):
+    """Return the path of a batch's extraction result (its .json sibling)."""
+    return os.path.splitext(batch)[0] + '.json'
+
+
+def partial_path(batch):
+    """Return the hidden file an extraction result is written to before it is checked."""
+    directory, name = os.path.split(result_path(batch))
+    return os.path.join(directory, '.' + name + '.part')
+
+
+def hash_batch(batch):
+    """Return the SHA-256 hex digest of a batch file."""
+    with open(batch, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_state(state_file):
+    """Load the scheduler state, or an empty one if missing or unreadable."""
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {"batches": {}}
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        print(f"Warning: Could not load {state_file}, starting over: {e}")
+        return {"batches": {}}
+    if not isinstance(state, dict) or not isinstance(state.get("batches"), dict):
+        return {"batches": {}}
+    return state
+
+
+def save_state(state, state_file):
+    """Write the scheduler state atomically."""
+    os.makedirs(os.path.dirname(state_file) or '.', exist_ok=True)
+    write_atomic(state_file, json.dumps(state, indent=2, ensure_ascii=False) + '\n')
+
+
+def pending_batches(batches, state, skip_failed=False):
+    """Return [(batch, reason)] for the batches that need extraction.
+
+    The reason is "new" for a batch without a result, "changed" for one whose
+    result this script produced from different batch content, and "failed"
+    for one whose last extraction failed (a changed batch keeps its out of
+    date result until it is extracted again).
+    """
+    pending = []
+    for batch in batches:
+        record = state["batches"].get(batch, {})
+        if record.get("status") == "failed":
+            if not skip_failed:
+                pending.append((batch, "failed"))
+        elif not os.path.exists(result_path(batch)):
+            pending.append((batch, "new"))
+        elif record.get("status") == "done" and record.get("batch_sha256") != hash_batch(batch):
+            pending.append((batch, "changed"))
+    return pending
+
+
+def check_result(result_file):
+    """Check an extraction result with the merge schema checks.
+
+    Returns (entries, problem), where problem is None for a result that is a
+    valid character document (or list) whose entries all pass validate_entry,
+    and otherwise describes what is wrong.
+    """
+    stream = CharacterStream(result_file)
+    counts = Counter()
+    invalid = 0
+    try:
+        for entry in stream:
+            violations = (validate_entry(entry) if isinstance(entry, dict)
+                          else [("type", "<entry>", "entry should be an object")])
+            if violations:
+                invalid += 1
+                counts.update(f"{kind} {field}" for kind, field, _ in violations)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return stream.count, f"malformed JSON: {e}"
+    if not stream.has_characters and stream.count == 0:
+        with open(result_file, 'rb') as f:
+            if f.read(1024).lstrip()[:1] != b'[':
+                return 0, 'no "characters" array'
+    if invalid:
+        details = ', '.join(f"{name}: {count}" for name, count in counts.most_common(3))
+        return stream.count, f"{invalid} of {stream.count} entries have violations ({details})"
+    return stream.count, None
+
+
+def extractor_command(template, batch, output):
+    """Return the argv of the extractor for one batch."""
+    return [arg.replace('{input}', batch).replace('{output}', output)
+            for arg in shlex.split(template)]
+
+
+def run_attempt(template, batch, output, timeout):
+    """Run the extractor once, writing its result to output. Returns an error or None."""
+    argv = extractor_command(template, batch, output)
+    to_stdout = '{output}' not in template
+    try:
+        if to_stdout:
+            with open(output, 'wb') as f:
+                completed = subprocess.run(argv, stdout=f, stderr=subprocess.PIPE,
+                                           timeout=timeout)
+        else:
+            completed = subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                       timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return f"timed out after {timeout:g}s"
+    except OSError as e:
+        return f"could not run extractor: {e}"
+    if completed.returncode != 0:
+        lines = completed.stderr.decode('utf-8', 'replace').strip().splitlines()
+        return f"exit status {completed.returncode}" + (f": {lines[-1]}" if lines else "")
+    if not os.path.exists(output):
+        return "extractor wrote no result"
+    return None
+
+
+def extract_batch(batch, template, retries, retry_delay, timeout, keep_invalid):
+    """Extract one batch, retrying failed attempts. Returns its state record."""
+    batch_sha256 = hash_batch(batch)
+    output = partial_path(batch)
+    start = time.perf_counter()
+    error = None
+    entries = 0
+    attempts = 0
+
+    for attempt in range(retries + 1):
+        if attempt and _stopping.wait(retry_delay * 2 ** (attempt - 1)):
+            break
+        attempts += 1
+        if os.path.exists(output):
+            os.remove(output)
+        error = run_attempt(template, batch, output, timeout)
+        if error is None:
+            entries, problem = check_result(output)
+            if problem is not None and not keep_invalid:
+                error = problem
+            else:
+                os.replace(output, result_path(batch))
+                return {
+                    "status": "done",
+                    "batch_sha256": batch_sha256,
+                    "entries": entries,
+                    "attempts": attempts,
+                    "seconds": round(time.perf_counter() - start, 2),
+                    "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    **({"warning": problem} if problem else {}),
+                }
+        if _stopping.is_set():
+            break
+
+    if os.path.exists(output):
+        os.remove(output)
+    return {
+        "status": "failed",
+        "batch_sha256": batch_sha256,
+        "attempts": attempts,
+        "seconds": round(time.perf_counter() - start, 2),
+        "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "error": error,
+    }
+
+
+def describe(record):
+    """Return a one-line report of a batch's outcome."""
+    attempts = f", {record['attempts']} attempts" if record["attempts"] > 1 else ""
+    if record["status"] == "done":
+        line = f"✓ {record['entries']} entries ({record['seconds']:.1f}s{attempts})"
+        if record.get("warning"):
+            line += f" ⚠ kept with {record['warning']}"
+        return line
+    return f"✗ {record['error']} ({record['seconds']:.1f}s{attempts})"
+
+
+def run_scheduler(pending, state, state_file, template, jobs, **options):
+    """Extract the pending batches in a thread pool, saving the state after each one.
+
+    Returns (done, failed, entries).
+    """
+    done = failed = entries = 0
+    executor = ThreadPoolExecutor(max_workers=max(1, jobs))
+    futures = {executor.submit(extract_batch, batch, template, **options): batch
+               for batch, _ in pending}
+    try:
+        for index, future in enumerate(as_completed(futures), 1):
+            batch = futures[future]
+            record = future.result()
+            state["batches"][batch] = record
+            save_state(state, state_file)
+            if record["status"] == "done":
+                done += 1
+                entries += record["entries"]
+            else:
+                failed += 1
+            print(f"[{index}/{len(futures)}] {batch}: {describe(record)}")
+    except KeyboardInterrupt:
+        _stopping.set()
+        print("\nInterrupted, waiting for running extractions to stop...")
+        executor.shutdown(wait=True, cancel_futures=True)
+        # Extractions cut short by the interrupt stay pending rather than failed
+        for future, batch in futures.items():
+            if (future.done() and not future.cancelled()
+                    and future.result()["status"] == "done"):
+                state["batches"][batch] = future.result()
+        save_state(state, state_file)
+        print("Run the same command again to resume with the pending batches.")
+        sys.exit(130)
+    executor.shutdown()
+    return done, failed, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run an extractor over the batches that have no extraction result yet."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=[BATCH_DIR],
+        help=f"Batch files or directories to extract (default: {BATCH_DIR})"
+    )
+    parser.add_argument(
+        "--extractor",
+        metavar="CMD",
+        help="Extractor command; {input} is replaced by the batch file and {output} by the "
+             "result file (without {output}, the command's stdout is the result)"
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f"Number of batches to extract at a time (default: {DEFAULT_JOBS})"
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="Retries of a failed extraction (default: 2)"
+    )
+    parser.add_argument(
+        "--retry-delay",
+        type=float,
+        default=5.0,
+        metavar="S",
+        help="Seconds before the first retry, doubled for every further one (default: 5)"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        metavar="S",
+        help="Seconds after which an extraction attempt is stopped (default: no limit)"
+    )
+    parser.add_argument(
+        "--keep-invalid",
+        action="store_true",
+        help="Keep results whose entries have schema violations instead of retrying them"
+    )
+    parser.add_argument(
+        "--skip-failed",
+        action="store_true",
+        help="Skip batches whose last extraction failed"
+    )
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="Only list the pending batches"
+    )
+    parser.add_argument(
+        "--state",
+        default=STATE_FILE,
+        metavar="FILE",
+        help=f"Scheduler state file (default: {STATE_FILE})"
+    )
+
+    args = parser.parse_args()
+    if not args.list and not args.extractor:
+        parser.error("--extractor is required unless --list is given")
+
+    state = load_state(args.state)
+    batches = find_batches(args.paths)
+    pending = pending_batches(batches, state, args.skip_failed)
+    reasons = Counter(reason for _, reason in pending)
+    print(f"Found {len(batches)} batches, {len(pending)} pending "
+          f"({reasons['new']} new, {reasons['changed']} changed, {reasons['failed']} failed before)")
+
+    if args.list:
+        for batch, reason in pending:
+            print(f"  {batch} ({reason})")
+        return
+    if not pending:
+        return
+
+    print(f"Extracting with {min(args.jobs, len(pending))} parallel jobs: {args.extractor}\n")
+    start = time.perf_counter()
+    done, failed, entries = run_scheduler(
+        pending, state, args.state, args.extractor, args.jobs,
+        retries=args.retries, retry_delay=args.retry_delay, timeout=args.timeout,
+        keep_invalid=args.keep_invalid)
+    elapsed = time.perf_counter() - start
+
+    print("\n=== Summary ===")
+    print(f"Batches extracted: {done} ({entries} entries)")
+    print(f"Batches failed: {failed}")
+    print(f"Time: {elapsed:.1f}s ({done / elapsed * 60 if elapsed else 0:.1f} batches/min)")
+    if failed:
+        print(f"Errors are recorded in {args.state}; run again to retry the failed batches.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
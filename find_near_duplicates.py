@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Find character entries that are probably the same character under a
+slightly different name, e.g. "HAL 9000" vs "HAL-9000" or
+"2001: A Space Odyssey" vs "2001 A Space Odyssey".
+
+merge_json_files.py only treats entries as duplicates when their
+(character_name, work_name) match exactly. This script finds candidate
+clusters for manual review without comparing every pair of entries:
+
+1. Names are normalized into tokens (accents, case and punctuation removed)
+2. Candidate pairs come from three indexes: entries with the same
+   normalized character name, entries of the same normalized work, and
+   MinHash/LSH buckets over character_description
+3. Each candidate pair is scored on name, work and description similarity,
+   and pairs that pass are joined into clusters with union-find
+
+Usage:
+    python3 find_near_duplicates.py [FILE ...] [-o OUTPUT]
+
+With no files, checks ai-character-db.json and incomplete-entries.json.
+Writes the clusters to .near-duplicate-entries.json.
+"""
+
+import argparse
+import json
+import operator
+import re
+import time
+import unicodedata
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from character_stream import iter_characters
+
+
+DEFAULT_INPUTS = ["ai-character-db.json", "incomplete-entries.json"]
+# The leading dot keeps the review file out of the "*.json" glob that
+# merge_json_files.py uses to find source files.
+DEFAULT_OUTPUT = ".near-duplicate-entries.json"
+
+# MinHash signature length and LSH banding. With 16 bands of 4 rows, pairs
+# with a description similarity of 0.5 become candidates ~64% of the time,
+# pairs at 0.7 ~98% of the time, pairs at 0.2 only ~2.5% of the time.
+NUM_BINS = 64
+BANDS = 16
+
+# Minimum estimated description similarity for a description-only match
+DESCRIPTION_THRESHOLD = 0.5
+
+# Blocks larger than this (e.g. every "Computer" in the corpus) are too
+# generic to say anything and would make the candidate set quadratic.
+MAX_BLOCK_SIZE = 200
+
+SHINGLE_SIZE = 2
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+_EMPTY_BIN = 1 << 64
+
+
+def tokenize(text: Any) -> List[str]:
+    """Split text into lowercase ASCII tokens, dropping accents and punctuation."""
+    if not isinstance(text, str):
+        return []
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return _TOKEN.findall(text.lower())
+
+
+def shingle_hashes(tokens: List[str], size: int = SHINGLE_SIZE) -> Set[int]:
+    """Hash the word n-grams of a token list into well-mixed 64-bit values."""
+    if len(tokens) < size:
+        grams = [' '.join(tokens)] if tokens else []
+    else:
+        grams = [' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+    return {(zlib.crc32(gram.encode('utf-8')) * _HASH_MULTIPLIER) & _MASK64 for gram in grams}
+
+
+def minhash_signature(hashes: Set[int], num_bins: int = NUM_BINS) -> Optional[Tuple[int, ...]]:
+    """Compute a one-permutation MinHash signature.
+
+    Each shingle hash is assigned to one of num_bins bins by its top bits and
+    each bin keeps its minimum, so a signature costs one pass over the
+    shingles instead of one pass per hash function. Empty bins borrow the
+    value of the next non-empty bin (rotation densification), which keeps the
+    fraction of equal bins an estimate of the Jaccard similarity.
+    """
+    if not hashes:
+        return None
+
+    shift = 64 - (num_bins - 1).bit_length()
+    bins = [_EMPTY_BIN] * num_bins
+    for h in hashes:
+        b = h >> shift
+        if h < bins[b]:
+            bins[b] = h
+
+    dense = list(bins)
+    next_value = None
+    distance = 0
+    # Walk right to left twice so wrap-around bins find their neighbour too
+    for i in range(2 * num_bins - 1, -1, -1):
+        value = bins[i % num_bins]
+        if value != _EMPTY_BIN:
+            next_value = value
+            distance = 0
+        else:
+            distance += 1
+            if i < num_bins:
+                dense[i] = next_value + distance * _EMPTY_BIN
+    return tuple(dense)
+
+
+def estimate_similarity(sig1: Optional[Tuple[int, ...]], sig2: Optional[Tuple[int, ...]]) -> float:
+    """Estimate the Jaccard similarity of two descriptions from their signatures."""
+    if sig1 is None or sig2 is None:
+        return 0.0
+    return sum(map(operator.eq, sig1, sig2)) / len(sig1)
+
+
+def token_jaccard(tokens1: Set[str], tokens2: Set[str]) -> float:
+    if not tokens1 or not tokens2:
+        return 0.0
+    return len(tokens1 & tokens2) / len(tokens1 | tokens2)
+
+
+def token_containment(tokens1: Set[str], tokens2: Set[str]) -> float:
+    """Share of the smaller token set found in the other, so "Hyperion" matches
+    "Hyperion (Dan Simmons)"."""
+    if not tokens1 or not tokens2:
+        return 0.0
+    return len(tokens1 & tokens2) / min(len(tokens1), len(tokens2))
+
+
+class IndexedEntry:
+    """The normalized name tokens and description signature of one entry."""
+
+    __slots__ = ("source", "index", "entry", "name_key", "name_tokens",
+                 "work_key", "work_tokens", "signature")
+
+    def __init__(self, source: str, index: int, entry: Dict[str, Any], num_bins: int):
+        self.source = source
+        self.index = index
+        self.entry = entry
+        name_tokens = tokenize(entry.get("character_name"))
+        work_tokens = tokenize(entry.get("work_name"))
+        self.name_key = ''.join(name_tokens)
+        self.name_tokens = frozenset(name_tokens)
+        self.work_key = ''.join(work_tokens)
+        self.work_tokens = frozenset(work_tokens)
+        self.signature = minhash_signature(
+            shingle_hashes(tokenize(entry.get("character_description"))), num_bins)
+
+
+def candidate_pairs(items: List[IndexedEntry], bands: int = BANDS,
+                    max_block_size: int = MAX_BLOCK_SIZE) -> Set[Tuple[int, int]]:
+    """Collect pairs of item positions that share at least one index bucket."""
+    buckets = defaultdict(list)
+    for pos, item in enumerate(items):
+        if item.name_key:
+            buckets[("name", item.name_key)].append(pos)
+        if item.work_key:
+            buckets[("work", item.work_key)].append(pos)
+        if item.signature is not None:
+            rows = len(item.signature) // bands
+            for band in range(bands):
+                buckets[("lsh", band, item.signature[band * rows:(band + 1) * rows])].append(pos)
+
+    pairs = set()
+    for members in buckets.values():
+        if len(members) < 2 or len(members) > max_block_size:
+            continue
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                pairs.add((first, second))
+    return pairs
+
+
+def score_pair(a: IndexedEntry, b: IndexedEntry,
+               description_threshold: float = DESCRIPTION_THRESHOLD) -> Optional[Dict[str, Any]]:
+    """Score a candidate pair. Returns the scores if it looks like a duplicate, else None.
+
+    A pair matches when:
+    - the normalized character names are equal and the works overlap or the
+      descriptions are similar, or
+    - the normalized work names are equal and the character names share most
+      tokens ("Android 20 / Dr. Gero" vs "Dr. Gero", but not "Android 16"
+      vs "Android 17"), or
+    - the descriptions are similar and the names or works overlap
+    """
+    name = 1.0 if a.name_key and a.name_key == b.name_key else token_jaccard(a.name_tokens, b.name_tokens)
+    work = 1.0 if a.work_key and a.work_key == b.work_key else token_containment(a.work_tokens, b.work_tokens)
+    if name < 0.5 and work < 0.5:
+        # Most candidates from description buckets end here, before the costlier signature comparison
+        return None
+    description = estimate_similarity(a.signature, b.signature)
+
+    if name == 1.0:
+        matched = work >= 0.5 or description >= description_threshold
+    elif work == 1.0:
+        matched = name >= 0.5
+    else:
+        matched = description >= description_threshold
+
+    if not matched:
+        return None
+    return {
+        "name_similarity": round(name, 3),
+        "work_similarity": round(work, 3),
+        "description_similarity": round(description, 3)
+    }
+
+
+def find_clusters(items: List[IndexedEntry], bands: int = BANDS,
+                  description_threshold: float = DESCRIPTION_THRESHOLD,
+                  max_block_size: int = MAX_BLOCK_SIZE) -> Tuple[List[Dict[str, Any]], int]:
+    """Group items into clusters of likely duplicates.
+
+    Returns (clusters, number of candidate pairs scored). Each cluster lists
+    its members (positions in items, in input order) and the matching pairs.
+    """
+    parent = list(range(len(items)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    pairs = candidate_pairs(items, bands, max_block_size)
+    matches = []
+    for first, second in sorted(pairs):
+        scores = score_pair(items[first], items[second], description_threshold)
+        if scores is not None:
+            matches.append((first, second, scores))
+            root1, root2 = find(first), find(second)
+            if root1 != root2:
+                parent[max(root1, root2)] = min(root1, root2)
+
+    clusters = defaultdict(lambda: {"members": [], "pairs": []})
+    for pos in range(len(items)):
+        clusters[find(pos)]["members"].append(pos)
+    for first, second, scores in matches:
+        clusters[find(first)]["pairs"].append((first, second, scores))
+
+    result = [cluster for cluster in clusters.values() if len(cluster["members"]) > 1]
+    result.sort(key=lambda cluster: cluster["members"][0])
+    return result, len(pairs)
+
+
+def load_items(paths: Iterable[str], num_bins: int = NUM_BINS) -> List[IndexedEntry]:
+    items = []
+    for path in paths:
+        try:
+            for index, entry in enumerate(iter_characters(path)):
+                if isinstance(entry, dict):
+                    items.append(IndexedEntry(path, index, entry, num_bins))
+        except FileNotFoundError:
+            print(f"Skipping {path}: not found")
+        except (json.JSONDecodeError, UnicodeDecodeError, IOError) as e:
+            print(f"Warning: Could not load {path}: {e}")
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find clusters of near-duplicate character entries for manual review."
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        default=DEFAULT_INPUTS,
+        help=f"Character JSON files to check (default: {' '.join(DEFAULT_INPUTS)})"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        default=DEFAULT_OUTPUT,
+        help=f"Review file to write (default: {DEFAULT_OUTPUT})"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DESCRIPTION_THRESHOLD,
+        help=f"Minimum description similarity for a description match (default: {DESCRIPTION_THRESHOLD})"
+    )
+
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    items = load_items(args.files)
+    print(f"Indexed {len(items)} entries in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    clusters, candidates = find_clusters(items, description_threshold=args.threshold)
+    print(f"Scored {candidates} candidate pairs in {time.perf_counter() - start:.2f}s")
+
+    output = {
+        "metadata": {
+            "total_clusters": len(clusters),
+            "total_entries": sum(len(cluster["members"]) for cluster in clusters),
+            "sources": args.files,
+            "generated_by": "find_near_duplicates.py"
+        },
+        "clusters": []
+    }
+    for number, cluster in enumerate(clusters, 1):
+        position = {pos: i for i, pos in enumerate(cluster["members"])}
+        output["clusters"].append({
+            "cluster": number,
+            "members": [
+                {"file": items[pos].source, "index": items[pos].index,
+                 "character_name": items[pos].entry.get("character_name"),
+                 "work_name": items[pos].entry.get("work_name")}
+                for pos in cluster["members"]
+            ],
+            "matches": [
+                dict(first=position[first], second=position[second], **scores)
+                for first, second, scores in cluster["pairs"]
+            ],
+            "characters": [items[pos].entry for pos in cluster["members"]]
+        })
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+
+    print(f"\nFound {len(clusters)} clusters of near-duplicate entries")
+    for number, cluster in enumerate(clusters[:20], 1):
+        names = "; ".join(f"{items[pos].entry.get('character_name')} from {items[pos].entry.get('work_name')}"
+                          for pos in cluster["members"])
+        print(f"  {number}. {names}")
+    if len(clusters) > 20:
+        print(f"  ... and {len(clusters) - 20} more")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
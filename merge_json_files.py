@@ -7,9 +7,59 @@ Filters entries based on completeness, multi-work conflicts, and duplicates.
 import json
 import glob
 import argparse
+import hashlib
 import os
-from collections import defaultdict
-from typing import List, Dict, Any, Tuple
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Any, Optional, Tuple
+
+import character_db
+from character_record import compact_entries, json_default
+from character_stream import (WRITE_THREADS, CharacterWriter, hash_file, iter_characters,
+                              report_peak_memory, run_concurrently)
+from split_json_by_work_type import split_characters
+from work_type_rules import DEFAULT_RULES_FILE, WorkTypeNormalizer, load_rules
+
+
+# Default location of the incremental merge cache (see load_all_json_files).
+# The leading dot keeps it out of the "*.json" glob used to find source files.
+DEFAULT_CACHE_FILE = ".merge-cache.json"
+CACHE_VERSION = 2
+
+
+# Character entry schema v4.0 (collection-guide.md), the single definition
+# behind get_required_fields, get_valid_fields, has_unexpected_fields,
+# is_complete and the compiled validator. For each field:
+# - required: must be present and not null
+# - types: allowed JSON value types (null is always allowed for optional fields)
+# - allow_empty: a required field that may be "" or []
+# - items: type of the elements of a list field
+# - enum: the allowed values of a categorical field
+SCHEMA: Dict[str, Dict[str, Any]] = {
+    "source_urls": {"required": True, "types": (list,), "allow_empty": True, "items": str},
+    "work_url": {"required": True, "types": (str,), "allow_empty": True},
+    "work_type": {"required": True, "types": (str,)},
+    "work_name": {"required": True, "types": (str,)},
+    "character_name": {"required": True, "types": (str,)},
+    "character_description": {"required": True, "types": (str,)},
+    "ai_qualification": {"required": True, "types": (str,),
+                         "enum": ("Pass", "Fail", "Ambiguous")},
+    "ai_qualification_explanation": {"required": True, "types": (str,)},
+    "benevolence_rating": {"required": True, "types": (str,),
+                           "enum": ("Benevolent", "Ambiguous", "Malevolent", "N/A")},
+    "benevolence_rating_explanation": {"required": True, "types": (str,)},
+    "alignment_rating": {"required": True, "types": (str,),
+                         "enum": ("Aligned", "Ambiguous", "Misaligned", "N/A")},
+    "alignment_rating_explanation": {"required": True, "types": (str,)},
+    "publication_year": {"required": False, "types": (int,)},
+    "character_type": {"required": False, "types": (str,)},
+    "needs_research": {"required": False, "types": (bool,)},
+}
+
+_MISSING = object()
 
 
 def get_required_fields() -> List[str]:
@@ -21,20 +71,7 @@ def get_required_fields() -> List[str]:
     - work_url can be empty string ""
     - All other fields are required
     """
-    return [
-        "source_urls",
-        "work_url",
-        "work_type",
-        "work_name",
-        "character_name",
-        "character_description",
-        "ai_qualification",
-        "ai_qualification_explanation",
-        "benevolence_rating",
-        "benevolence_rating_explanation",
-        "alignment_rating",
-        "alignment_rating_explanation"
-    ]
+    return [field for field, spec in SCHEMA.items() if spec["required"]]
 
 
 def get_valid_fields() -> List[str]:
@@ -42,11 +79,17 @@ def get_valid_fields() -> List[str]:
 
     Based on collection-guide.md schema v4.0.
     """
-    return get_required_fields() + [
-        "publication_year",
-        "character_type",
-        "needs_research"
-    ]
+    return get_required_fields() + [field for field, spec in SCHEMA.items() if not spec["required"]]
+
+
+VALID_FIELDS = frozenset(get_valid_fields())
+
+# (field, types) per required field; types is only set for fields that may be
+# empty, which must then have exactly that type (see is_complete)
+_COMPLETENESS_CHECKS = tuple(
+    (field, spec["types"] if spec.get("allow_empty") else None)
+    for field, spec in SCHEMA.items() if spec["required"]
+)
 
 
 def has_unexpected_fields(entry: Dict[str, Any]) -> bool:
@@ -54,11 +97,7 @@ def has_unexpected_fields(entry: Dict[str, Any]) -> bool:
 
     Returns True if there are unexpected fields, False otherwise.
     """
-    valid_fields = set(get_valid_fields())
-    entry_fields = set(entry.keys())
-    unexpected = entry_fields - valid_fields
-
-    return len(unexpected) > 0
+    return not entry.keys() <= VALID_FIELDS
 
 
 def is_complete(entry: Dict[str, Any]) -> bool:
@@ -69,34 +108,145 @@ def is_complete(entry: Dict[str, Any]) -> bool:
     - work_url: can be empty string "" (but must exist)
     - All other required fields must have non-empty values
     """
-    required_fields = get_required_fields()
+    for field, exact_types in _COMPLETENESS_CHECKS:
+        value = entry.get(field)
 
-    for field in required_fields:
         # Field is missing or is None
-        if field not in entry or entry[field] is None:
+        if value is None:
             return False
 
-        # Special case: source_urls can be empty array
-        if field == "source_urls":
-            if not isinstance(entry[field], list):
-                return False
-            # Empty array is OK
-            continue
-
-        # Special case: work_url can be empty string
-        if field == "work_url":
-            if not isinstance(entry[field], str):
+        # Fields that may be empty only need the right type
+        if exact_types is not None:
+            if not isinstance(value, exact_types):
                 return False
-            # Empty string is OK
             continue
 
         # All other fields: must not be empty
-        if isinstance(entry[field], str) and entry[field].strip() == "":
+        if isinstance(value, str) and value.strip() == "":
             return False
 
     return True
 
 
+def _type_names(types: Tuple[type, ...]) -> str:
+    return "|".join(t.__name__ for t in types)
+
+
+def _collect_violations(entry: Dict[str, Any], schema: Dict[str, Dict[str, Any]],
+                        valid_fields: frozenset) -> List[Tuple[str, str, str]]:
+    """Check an entry against every rule of a schema, collecting all violations."""
+    violations = []
+
+    for field in entry.keys() - valid_fields:
+        violations.append(("unexpected", field, f"unexpected field '{field}'"))
+
+    for field, spec in schema.items():
+        value = entry.get(field, _MISSING)
+
+        if value is _MISSING or value is None:
+            if spec["required"]:
+                violations.append(("missing", field, f"missing required field '{field}'"))
+            continue
+
+        # bool is a subclass of int, so compare exact types
+        if type(value) not in spec["types"]:
+            violations.append(("type", field, f"'{field}' should be {_type_names(spec['types'])}, "
+                                              f"got {type(value).__name__}"))
+            continue
+
+        if spec["required"] and not spec.get("allow_empty") and isinstance(value, str) \
+                and value.strip() == "":
+            violations.append(("empty", field, f"required field '{field}' is empty"))
+            continue
+
+        if "items" in spec:
+            for item in value:
+                if type(item) is not spec["items"]:
+                    violations.append(("type", field, f"'{field}' items should be "
+                                                      f"{spec['items'].__name__}, got {type(item).__name__}"))
+                    break
+
+        if "enum" in spec and value not in spec["enum"]:
+            violations.append(("enum", field, f"'{field}' has invalid value {value!r} "
+                                              f"(expected {'|'.join(spec['enum'])})"))
+
+    return violations
+
+
+def compile_validator(schema: Dict[str, Dict[str, Any]] = SCHEMA):
+    """Compile a schema into a fast validation function.
+
+    The returned function takes an entry and returns a list of
+    (kind, field, message) violations, where kind is one of "unexpected",
+    "missing", "type", "empty" or "enum"; the list is empty for a valid entry.
+
+    The schema is flattened once into a tuple of per-field checks, so the
+    common case of a valid entry is settled in a single pass with no lookups
+    in the schema. Only entries that fail this fast check are re-checked rule
+    by rule to collect every violation.
+    """
+    valid_fields = frozenset(schema)
+    checks = tuple(
+        (field,
+         spec["required"],
+         frozenset(spec["types"]),
+         frozenset(spec["enum"]) if "enum" in spec else None,
+         spec["required"] and not spec.get("allow_empty"),
+         spec.get("items"))
+        for field, spec in schema.items()
+    )
+
+    def is_valid(entry: Dict[str, Any]) -> bool:
+        if not entry.keys() <= valid_fields:
+            return False
+        get = entry.get
+        for field, required, types, enum, non_empty, items in checks:
+            value = get(field)
+            if value is None:
+                if required:
+                    return False
+                continue
+            # bool is a subclass of int, so compare exact types. The type is
+            # checked first, so the enum test only ever sees hashable values.
+            if value.__class__ not in types:
+                return False
+            if enum is not None and value not in enum:
+                return False
+            if non_empty and value.__class__ is str and not value.strip():
+                return False
+            if items is not None:
+                for item in value:
+                    if item.__class__ is not items:
+                        return False
+        return True
+
+    def validate(entry: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+        return [] if is_valid(entry) else _collect_violations(entry, schema, valid_fields)
+
+    return validate
+
+
+validate_entry = compile_validator()
+
+
+def has_invalid_values(entry: Dict[str, Any]) -> bool:
+    """Check if an entry has values of the wrong type or outside a field's allowed values."""
+    return any(kind in ("type", "enum") for kind, _, _ in validate_entry(entry))
+
+
+def summarize_violations(entries: List[Dict[str, Any]]) -> Tuple[int, Counter, float]:
+    """Validate entries, returning (entries with violations, counts by (kind, field), seconds)."""
+    start = time.perf_counter()
+    invalid = 0
+    counts = Counter()
+    for entry in entries:
+        violations = validate_entry(entry)
+        if violations:
+            invalid += 1
+            counts.update((kind, field) for kind, field, _ in violations)
+    return invalid, counts, time.perf_counter() - start
+
+
 def get_entry_key(entry: Dict[str, Any]) -> Tuple[str, str]:
     """Get the key tuple (character_name, work_name) for grouping entries."""
     char_name = entry.get("character_name", "").strip()
@@ -115,6 +265,19 @@ def is_empty_value(value: Any) -> bool:
     return False
 
 
+def compute_fingerprint(entry: Dict[str, Any]) -> str:
+    """Hash an entry's non-metadata fields into a stable canonical fingerprint.
+
+    Two entries have the same fingerprint exactly when they hold the same
+    data, regardless of key order.
+    """
+    canonical = json.dumps(
+        {k: v for k, v in entry.items() if k != "metadata"},
+        sort_keys=True, ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+
 def entries_are_identical(entry1: Dict[str, Any], entry2: Dict[str, Any]) -> bool:
     """Check if two entries are identical (same data, not just same character/work).
 
@@ -124,20 +287,16 @@ def entries_are_identical(entry1: Dict[str, Any], entry2: Dict[str, Any]) -> boo
 
     Returns True if entries are identical.
     """
-    # Compare all fields except metadata-like fields that might differ
-    e1_copy = {k: v for k, v in entry1.items() if k not in ["metadata"]}
-    e2_copy = {k: v for k, v in entry2.items() if k not in ["metadata"]}
-
-    # First check: exact match
-    if json.dumps(e1_copy, sort_keys=True) == json.dumps(e2_copy, sort_keys=True):
+    # First check: exact match (the check below also covers it, field by field)
+    if entry1 == entry2:
         return True
 
     # Second check: differ only by missing/empty values
-    all_keys = set(e1_copy.keys()) | set(e2_copy.keys())
+    all_keys = (entry1.keys() | entry2.keys()) - {"metadata"}
 
     for key in all_keys:
-        val1 = e1_copy.get(key)
-        val2 = e2_copy.get(key)
+        val1 = entry1.get(key)
+        val2 = entry2.get(key)
 
         # If both have values, they must match
         if not is_empty_value(val1) and not is_empty_value(val2):
@@ -191,21 +350,23 @@ def merge_entries(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
     return merged
 
 
-def remove_identical_duplicates(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def remove_identical_duplicates(entries: List[Dict[str, Any]],
+                                fingerprints: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     """Remove entries that are completely identical to another entry.
 
-    Keeps only one copy of each unique entry.
+    Keeps only one copy of each unique entry. fingerprints, if given, holds
+    the fingerprint of each entry (as returned by load_all_json_files);
+    otherwise they are computed here.
     """
     unique_entries = []
-    seen_serialized = set()
-
-    for entry in entries:
-        # Serialize entry for comparison (excluding metadata fields)
-        entry_copy = {k: v for k, v in entry.items() if k not in ["metadata"]}
-        serialized = json.dumps(entry_copy, sort_keys=True)
-
-        if serialized not in seen_serialized:
-            seen_serialized.add(serialized)
+    seen_fingerprints = set()
+    if fingerprints is None:
+        fingerprints = map(compute_fingerprint, entries)
+
+    for entry, fingerprint in zip(entries, fingerprints):
+        # Fingerprints exclude metadata fields
+        if fingerprint not in seen_fingerprints:
+            seen_fingerprints.add(fingerprint)
             unique_entries.append(entry)
 
     duplicates_removed = len(entries) - len(unique_entries)
@@ -215,13 +376,12 @@ def remove_identical_duplicates(entries: List[Dict[str, Any]]) -> List[Dict[str,
     return unique_entries
 
 
-def load_all_json_files(include_batches: bool = False) -> List[Dict[str, Any]]:
-    """Load all JSON files in the current directory and extract character entries.
+def find_json_files(include_batches: bool = False) -> List[str]:
+    """Return the source JSON files to merge, in the order they are loaded.
 
     Args:
         include_batches: If True, also scan the batches directory and all subdirectories
     """
-    all_entries = []
     json_files = glob.glob("*.json")
 
     # If include_batches is True, add JSON files from batches directory
@@ -231,21 +391,196 @@ def load_all_json_files(include_batches: bool = False) -> List[Dict[str, Any]]:
         json_files.extend(batch_files)
         print(f"Scanning batches directory found {len(batch_files)} additional JSON files")
 
-    for file_path in json_files:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+    return json_files
 
-                # Handle different JSON structures
-                if isinstance(data, dict) and "characters" in data:
-                    all_entries.extend(data["characters"])
-                elif isinstance(data, list):
-                    all_entries.extend(data)
 
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Warning: Could not load {file_path}: {e}")
+def load_merge_cache(cache_file: str) -> Dict[str, Any]:
+    """Load the incremental merge cache, returning an empty cache if unusable."""
+    empty = {"version": CACHE_VERSION, "files": {}}
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        return empty
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"Warning: Ignoring unreadable cache {cache_file}: {e}")
+        return empty
 
-    return all_entries
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+        print(f"Warning: Ignoring cache {cache_file} from a different cache version")
+        return empty
+
+    return cache
+
+
+def save_merge_cache(cache: Dict[str, Any], cache_file: str):
+    """Save the incremental merge cache (compact, since only the script reads it)."""
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, separators=(',', ':'), default=json_default)
+
+
+def read_source(file_path: str, cached: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Stat and, if needed, hash one source file (runs in the I/O thread pool).
+
+    Returns a record with the file's stat info plus either the reusable cached
+    entries or a flag saying the file still has to be decoded. Errors are
+    returned as a message in the record instead of raised, so one bad file
+    cannot abort the rest of a parallel load.
+    """
+    record = {"path": file_path, "entries": None, "decode": False, "error": None}
+    try:
+        stat = os.stat(file_path)
+        record["mtime_ns"] = stat.st_mtime_ns
+        record["size"] = stat.st_size
+
+        # Unchanged size and mtime: trust the cached entries without reading the file
+        if (cached is not None and cached["mtime_ns"] == stat.st_mtime_ns
+                and cached["size"] == stat.st_size):
+            record["sha256"] = cached["sha256"]
+            record["entries"] = cached["entries"]
+            record["fingerprints"] = cached["fingerprints"]
+            return record
+
+        record["sha256"] = hash_file(file_path)
+
+        if cached is not None and cached["sha256"] == record["sha256"]:
+            # Touched but not modified: only the stat info needs refreshing
+            record["entries"] = cached["entries"]
+            record["fingerprints"] = cached["fingerprints"]
+        else:
+            record["decode"] = True
+    except IOError as e:
+        record["error"] = str(e)
+
+    return record
+
+
+def decode_source(file_path: str, normalizer: Optional[WorkTypeNormalizer] = None
+                  ) -> Tuple[Optional[List[Dict[str, Any]]], Optional[List[str]], Optional[str]]:
+    """Decode a source file into its character entries and their fingerprints.
+
+    The file is streamed entry by entry, so the document wrapper is never
+    held in memory. If a normalizer is given, each entry's work type is
+    normalized (see work_type_rules.py) before it is fingerprinted. Kept at
+    module level so it can run in a process pool, which then fingerprints
+    entries in parallel too. Returns (entries, fingerprints, None) on success
+    and (None, None, error message) on failure.
+    """
+    try:
+        entries = list(iter_characters(file_path))
+        if normalizer is not None:
+            for entry in entries:
+                if isinstance(entry, dict):
+                    normalizer.normalize_entry(entry)
+        return entries, [compute_fingerprint(entry) for entry in entries], None
+    except (json.JSONDecodeError, UnicodeDecodeError, IOError) as e:
+        return None, None, str(e)
+
+
+def load_all_json_files(include_batches: bool = False,
+                        cache_file: Optional[str] = None,
+                        workers: int = 1,
+                        decode_processes: int = 0,
+                        compact: bool = False,
+                        normalizer: Optional[WorkTypeNormalizer] = None
+                        ) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Load all JSON files in the current directory and extract character entries.
+
+    Args:
+        include_batches: If True, also scan the batches directory and all subdirectories
+        cache_file: If set, run incrementally. Each source file's size, mtime,
+            content hash and extracted entries are recorded in this cache, and on
+            later runs only files whose mtime/size and content hash changed are
+            re-parsed. Files that fail to load are never cached, so their warning
+            is repeated on every run.
+        workers: Number of threads used to stat, read and hash source files.
+        decode_processes: If greater than 0, decode JSON in a pool of this many
+            processes instead of in the main process.
+        compact: If True, return entries as CharacterRecord objects
+            (character_record.py) instead of dicts, which takes about half the
+            memory at the cost of somewhat slower filtering.
+        normalizer: If set, normalize every entry's work type with these
+            compiled rules as it is decoded. The cache records the rules' hash
+            and is discarded when the rules change.
+
+    Returns (entries, fingerprints), two parallel lists: the entries and the
+    canonical fingerprint of each (see compute_fingerprint), computed by the
+    decoding worker or taken from the cache, once per entry. Entries are
+    always returned in source file order, and load warnings are printed in
+    that order too, whatever the degree of parallelism.
+    """
+    all_entries = []
+    all_fingerprints = []
+    json_files = find_json_files(include_batches)
+
+    cache = load_merge_cache(cache_file) if cache_file else None
+    rules_hash = normalizer.rules_hash if normalizer is not None else None
+    if cache is not None and cache["files"] and cache.get("work_type_rules") != rules_hash:
+        print(f"Work type rules changed, ignoring cache {cache_file}")
+        cache["files"] = {}
+    cached_files = cache["files"] if cache else {}
+    cached = [cached_files.get(file_path) for file_path in json_files]
+
+    # Stage 1: stat and hash (I/O bound, so threads are enough)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            records = list(executor.map(read_source, json_files, cached))
+    else:
+        records = list(map(read_source, json_files, cached))
+
+    # Stage 2: decode the files that actually changed (CPU bound)
+    pending = [record for record in records if record["decode"]]
+    paths = [record["path"] for record in pending]
+    decode = partial(decode_source, normalizer=normalizer)
+    if decode_processes > 0 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=decode_processes) as executor:
+            decoded = list(executor.map(decode, paths, chunksize=4))
+    else:
+        decoded = list(map(decode, paths))
+
+    for record, (entries, fingerprints, error) in zip(pending, decoded):
+        record["entries"] = entries
+        record["fingerprints"] = fingerprints
+        record["error"] = error
+    reused = len(records) - len(pending)
+
+    # Stage 3: assemble in file order
+    new_cache_files = {}
+    added = Counter()
+    removed = Counter()
+    for record, cached_record in zip(records, cached):
+        if record["error"] is not None:
+            print(f"Warning: Could not load {record['path']}: {record['error']}")
+            continue
+
+        if compact:
+            record["entries"] = compact_entries(record["entries"])
+        all_entries.extend(record["entries"])
+        all_fingerprints.extend(record["fingerprints"])
+
+        if cache is not None:
+            new_cache_files[record["path"]] = {
+                "mtime_ns": record["mtime_ns"],
+                "size": record["size"],
+                "sha256": record["sha256"],
+                "entries": record["entries"],
+                "fingerprints": record["fingerprints"]
+            }
+            # Diff re-parsed files against what the cache had for them
+            if record["decode"]:
+                added.update(record["fingerprints"])
+                if cached_record is not None:
+                    removed.update(cached_record["fingerprints"])
+
+    if cache is not None:
+        print(f"Incremental cache: reused {reused} files, parsed {len(json_files) - reused} files")
+        print(f"Changes since last run: {sum((added - removed).values())} entries added, "
+              f"{sum((removed - added).values())} entries removed")
+        cache["files"] = new_cache_files
+        cache["work_type_rules"] = rules_hash
+        save_merge_cache(cache, cache_file)
+
+    return all_entries, all_fingerprints
 
 
 def sort_entries(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -260,117 +595,201 @@ def sort_entries(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     )
 
 
-def filter_entries(entries: List[Dict[str, Any]]) -> Tuple[
-    List[Dict[str, Any]],  # valid entries
-    List[Dict[str, Any]],  # invalid entries (unexpected fields)
-    List[Dict[str, Any]],  # incomplete entries
-    List[Dict[str, Any]],  # multi-work entries
-    List[Dict[str, Any]]   # duplicate entries
-]:
+def is_incomplete(entry: Dict[str, Any]) -> bool:
+    """Check if an entry is missing required fields (the inverse of is_complete)."""
+    return not is_complete(entry)
+
+
+def split_multi_work(group: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Reject a group whose entries differ in work_type or publication_year.
+
+    Returns (kept, rejected) for a group of entries sharing a
+    (character_name, work_name) key.
     """
-    Filter entries in the specified order:
-    0. Filter out invalid entries (with unexpected fields)
-    1. Filter out incomplete entries
-    2. Filter out multi-work entries (same char/work, different type/year)
-    3. Filter out duplicate entries (same char/work, different data)
+    work_types = set(e.get("work_type", "") for e in group)
+    # Check both 'year' and 'publication_year' for backwards compatibility
+    years = set()
+    for e in group:
+        year = e.get("publication_year") or e.get("year")
+        if year is not None:
+            years.add(year)
+
+    if len(work_types) > 1 or len(years) > 1:
+        # Different work types or years - this is a multi-work situation
+        return [], group
+    # Same work_type and year - left for the duplicate check
+    return group, []
+
+
+def resolve_duplicate_group(group: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Merge a group of identical entries, or reject it if the entries differ.
+
+    Returns (kept, rejected) for a group of entries sharing a
+    (character_name, work_name) key.
     """
+    # Compare first entry with all others
+    for other in group[1:]:
+        if not entries_are_identical(group[0], other):
+            # Entries differ - these are duplicates with different data
+            return [], group
 
-    # Step 0: Filter invalid entries (with unexpected fields)
-    valid_schema_entries = []
-    invalid_entries = []
+    # All entries are identical (possibly with missing data)
+    # Keep the most complete version by merging
+    return [merge_entries(group)], []
 
-    for entry in entries:
-        if has_unexpected_fields(entry):
-            invalid_entries.append(entry)
-        else:
-            valid_schema_entries.append(entry)
 
-    print(f"Step 0: Filtered out {len(invalid_entries)} invalid entries (unexpected fields)")
-    print(f"Remaining: {len(valid_schema_entries)} entries")
+# Filter pipeline stages, run in registration order by run_filter_pipeline.
+# Entry stages test one entry at a time; group stages see all entries that
+# share a (character_name, work_name) key and survived the entry stages.
+ENTRY_STAGES: List[Dict[str, Any]] = []
+GROUP_STAGES: List[Dict[str, Any]] = []
 
-    # Step 1: Filter incomplete entries
-    complete_entries = []
-    incomplete_entries = []
 
-    for entry in valid_schema_entries:
-        if is_complete(entry):
-            complete_entries.append(entry)
-        else:
-            incomplete_entries.append(entry)
+def register_entry_stage(name: str, bucket: str, rejects, label: str):
+    """Register a per-entry filter stage.
 
-    print(f"Step 1: Filtered out {len(incomplete_entries)} incomplete entries")
-    print(f"Remaining: {len(complete_entries)} entries")
+    Args:
+        name: Short stage name used in the report
+        bucket: Name of the output bucket rejected entries go to
+        rejects: Function taking an entry and returning True to reject it
+        label: Description of rejected entries for the report
+    """
+    ENTRY_STAGES.append({"name": name, "bucket": bucket, "check": rejects, "label": label})
 
-    # Step 2: Filter multi-work entries
-    # Group by (character_name, work_name)
-    grouped = defaultdict(list)
-    for entry in complete_entries:
-        key = get_entry_key(entry)
-        grouped[key].append(entry)
 
-    valid_after_multiwork = []
-    multi_work_entries = []
+def register_group_stage(name: str, bucket: str, resolve, label: str):
+    """Register a filter stage over groups of entries sharing a key.
 
-    for key, group in grouped.items():
-        if len(group) == 1:
-            # Only one entry for this character/work combo
-            valid_after_multiwork.append(group[0])
-        else:
-            # Multiple entries - check if they have different work_type or publication_year
-            work_types = set(e.get("work_type", "") for e in group)
-            # Check both 'year' and 'publication_year' for backwards compatibility
-            years = set()
-            for e in group:
-                year = e.get("publication_year") or e.get("year")
-                if year is not None:
-                    years.add(year)
-
-            if len(work_types) > 1 or len(years) > 1:
-                # Different work types or years - this is a multi-work situation
-                multi_work_entries.extend(group)
-            else:
-                # Same work_type and year - will check for duplicates in next step
-                valid_after_multiwork.extend(group)
+    Args:
+        name: Short stage name used in the report
+        bucket: Name of the output bucket rejected entries go to
+        resolve: Function taking a group of 2+ entries and returning
+            (kept, rejected) lists; kept entries may be merged or rewritten
+        label: Description of rejected entries for the report
+    """
+    GROUP_STAGES.append({"name": name, "bucket": bucket, "check": resolve, "label": label})
 
-    print(f"Step 2: Filtered out {len(multi_work_entries)} multi-work entries")
-    print(f"Remaining: {len(valid_after_multiwork)} entries")
 
-    # Step 3: Filter duplicate entries
-    # Group again by (character_name, work_name)
+register_entry_stage("schema", "invalid", has_unexpected_fields, "invalid entries (unexpected fields)")
+register_entry_stage("completeness", "incomplete", is_incomplete, "incomplete entries")
+register_group_stage("multi-work", "multi_work", split_multi_work, "multi-work entries")
+register_group_stage("duplicates", "duplicate", resolve_duplicate_group, "duplicate entries")
+
+# Extra entry stage used by --strict: wrong value types and values outside
+# a categorical field's allowed set are treated as invalid too
+STRICT_VALUES_STAGE = {
+    "name": "values",
+    "bucket": "invalid",
+    "check": has_invalid_values,
+    "label": "entries with invalid values (wrong type or not an allowed value)"
+}
+
+
+def run_filter_pipeline(entries: List[Dict[str, Any]],
+                        entry_stages: Optional[List[Dict[str, Any]]] = None,
+                        group_stages: Optional[List[Dict[str, Any]]] = None
+                        ) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]], List[Dict[str, Any]]]:
+    """Run entries through the filter stages in two fused passes.
+
+    Pass 1 runs every entry stage on each entry in turn and indexes the
+    survivors by (character_name, work_name). Pass 2 runs every group stage
+    on each group of that index. The key index is built only once, and single-
+    entry groups skip the group stages entirely.
+
+    Returns:
+        (valid entries, rejected entries by bucket name, per-stage stats).
+        Each stats record holds the stage name, label, entries in and out,
+        entries rejected and wall time in seconds.
+    """
+    entry_stages = ENTRY_STAGES if entry_stages is None else entry_stages
+    group_stages = GROUP_STAGES if group_stages is None else group_stages
+    stages = entry_stages + group_stages
+
+    buckets = {stage["bucket"]: [] for stage in stages}
+    stats = [{"name": stage["name"], "label": stage["label"],
+              "in": 0, "out": 0, "rejected": 0, "seconds": 0.0} for stage in stages]
+    entry_stats = stats[:len(entry_stages)]
+    group_stats = stats[len(entry_stages):]
+
+    # Pass 1: entry stages, building the key index from the survivors
     grouped = defaultdict(list)
-    for entry in valid_after_multiwork:
-        key = get_entry_key(entry)
-        grouped[key].append(entry)
+    clock = time.perf_counter
+    for entry in entries:
+        for stage, stat in zip(entry_stages, entry_stats):
+            stat["in"] += 1
+            start = clock()
+            rejected = stage["check"](entry)
+            stat["seconds"] += clock() - start
+            if rejected:
+                stat["rejected"] += 1
+                buckets[stage["bucket"]].append(entry)
+                break
+            stat["out"] += 1
+        else:
+            grouped[get_entry_key(entry)].append(entry)
 
+    # Pass 2: group stages over the key index
     valid_entries = []
-    duplicate_entries = []
-
-    for key, group in grouped.items():
+    for group in grouped.values():
         if len(group) == 1:
-            # Only one entry
+            # Only one entry for this character/work combo
+            for stat in group_stats:
+                stat["in"] += 1
+                stat["out"] += 1
             valid_entries.append(group[0])
+            continue
+
+        for stage, stat in zip(group_stages, group_stats):
+            stat["in"] += len(group)
+            start = clock()
+            group, rejected = stage["check"](group)
+            stat["seconds"] += clock() - start
+            stat["rejected"] += len(rejected)
+            stat["out"] += len(group)
+            buckets[stage["bucket"]].extend(rejected)
+            if not group:
+                break
+        valid_entries.extend(group)
+
+    return valid_entries, buckets, stats
+
+
+def print_pipeline_report(stats: List[Dict[str, Any]]):
+    """Print each filter stage's counts and wall time."""
+    for step, stat in enumerate(stats):
+        print(f"Step {step}: Filtered out {stat['rejected']} {stat['label']} "
+              f"[{stat['name']}: {stat['seconds'] * 1000:.1f} ms]")
+        if step < len(stats) - 1:
+            print(f"Remaining: {stat['out']} entries")
         else:
-            # Multiple entries - check if they're identical
-            # Compare first entry with all others
-            all_identical = True
-            for i in range(1, len(group)):
-                if not entries_are_identical(group[0], group[i]):
-                    all_identical = False
-                    break
+            print(f"Final valid entries: {stat['out']} entries")
 
-            if all_identical:
-                # All entries are identical (possibly with missing data)
-                # Keep the most complete version by merging
-                merged_entry = merge_entries(group)
-                valid_entries.append(merged_entry)
-            else:
-                # Entries differ - these are duplicates with different data
-                duplicate_entries.extend(group)
 
-    print(f"Step 3: Filtered out {len(duplicate_entries)} duplicate entries")
-    print(f"Final valid entries: {len(valid_entries)} entries")
+def filter_entries(entries: List[Dict[str, Any]], strict: bool = False) -> Tuple[
+    List[Dict[str, Any]],  # valid entries
+    List[Dict[str, Any]],  # invalid entries (unexpected fields)
+    List[Dict[str, Any]],  # incomplete entries
+    List[Dict[str, Any]],  # multi-work entries
+    List[Dict[str, Any]]   # duplicate entries
+]:
+    """
+    Filter entries in the specified order:
+    0. Filter out invalid entries (with unexpected fields)
+    1. Filter out incomplete entries
+    2. Filter out multi-work entries (same char/work, different type/year)
+    3. Filter out duplicate entries (same char/work, different data)
+
+    The steps are the registered stages of run_filter_pipeline. With
+    strict=True, entries whose values have the wrong type or are not one of
+    a field's allowed values are also filtered out as invalid, right after
+    the completeness check.
+    """
+    entry_stages = ENTRY_STAGES + [STRICT_VALUES_STAGE] if strict else ENTRY_STAGES
+    valid_entries, buckets, stats = run_filter_pipeline(entries, entry_stages=entry_stages)
+    print_pipeline_report(stats)
 
-    return valid_entries, invalid_entries, incomplete_entries, multi_work_entries, duplicate_entries
+    return (valid_entries, buckets["invalid"], buckets["incomplete"],
+            buckets["multi_work"], buckets["duplicate"])
 
 
 def add_missing_fields(entry: Dict[str, Any]) -> Dict[str, Any]:
@@ -395,13 +814,26 @@ def add_missing_fields(entry: Dict[str, Any]) -> Dict[str, Any]:
     return updated_entry
 
 
-def save_json(entries: List[Dict[str, Any]], filename: str, add_missing: bool = False):
+def save_json(entries: List[Dict[str, Any]], filename: str, add_missing: bool = False,
+              db=None, verbose: bool = True, standardized: bool = False):
     """Save entries to a JSON file.
 
+    The file is replaced atomically, and left untouched if its content
+    would not change (see CharacterWriter).
+
     Args:
         entries: List of character entries to save
         filename: Output filename
         add_missing: If True, add missing required fields initialized to empty values
+        db: Optional SQLite connection (see character_db.py). If given, the
+            entries are stored in the database as a document named after the
+            file, and the JSON file is exported from there.
+        verbose: Print a line once the file is saved
+        standardized: Mark the file's metadata with work_types_standardized
+            (the entries' work types were normalized while loading)
+
+    Returns:
+        (entries in the order saved, metadata written to the file)
     """
     # Add missing fields if requested
     if add_missing:
@@ -409,18 +841,26 @@ def save_json(entries: List[Dict[str, Any]], filename: str, add_missing: bool =
 
     sorted_entries = sort_entries(entries)
 
-    output = {
+    header = {
         "metadata": {
             "total_entries": len(sorted_entries),
             "generated_by": "merge_json_files.py"
-        },
-        "characters": sorted_entries
+        }
     }
+    if standardized:
+        header["metadata"]["work_types_standardized"] = True
 
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
+    if db is not None:
+        character_db.write_document(db, filename, sorted_entries, header)
+        character_db.export_document(db, filename)
+    else:
+        with CharacterWriter(filename, header=header) as writer:
+            writer.write_all(sorted_entries)
+            writer.commit()
 
-    print(f"Saved {len(sorted_entries)} entries to {filename}")
+    if verbose:
+        print(f"Saved {len(sorted_entries)} entries to {filename}")
+    return sorted_entries, header["metadata"]
 
 
 def main():
@@ -433,26 +873,148 @@ def main():
         action="store_true",
         help="Include JSON files from the batches directory and all subdirectories"
     )
+    parser.add_argument(
+        "-i", "--incremental",
+        action="store_true",
+        help="Only re-parse source files that changed since the last run, "
+             "using a per-file content-hash cache"
+    )
+    parser.add_argument(
+        "--cache-file",
+        default=DEFAULT_CACHE_FILE,
+        help=f"Cache file used by --incremental (default: {DEFAULT_CACHE_FILE})"
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Number of threads used to read source files (default: 1)"
+    )
+    parser.add_argument(
+        "--decode-processes",
+        type=int,
+        default=0,
+        help="Decode source JSON in this many worker processes (default: 0, decode in-process)"
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Hold entries as compact records with shared strings instead of dicts, roughly "
+             "halving memory use on large corpora (filtering is somewhat slower)"
+    )
+    parser.add_argument(
+        "--sqlite",
+        nargs="?",
+        const=character_db.DEFAULT_DB_FILE,
+        metavar="DB",
+        help="Also store the results in a SQLite database and export the JSON files from it "
+             f"(default database: {character_db.DEFAULT_DB_FILE})"
+    )
+    parser.add_argument(
+        "--no-split",
+        action="store_true",
+        help="Don't split ai-character-db.json into work type files under data/ afterwards"
+    )
+    parser.add_argument(
+        "--compact-shards",
+        action="store_true",
+        help="Write the work type files under data/ in the compact wire format"
+    )
+    parser.add_argument(
+        "--max-entries",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Page work types with more than N characters into several files under data/"
+    )
+    parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Page work types whose file under data/ would exceed about N bytes"
+    )
+    parser.add_argument(
+        "--coalesce-below",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Combine work types with fewer than N characters into shared files under data/"
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Also treat entries with wrong value types or values outside the schema's "
+             "allowed ratings as invalid"
+    )
+    parser.add_argument(
+        "--work-type-rules",
+        default=DEFAULT_RULES_FILE,
+        metavar="FILE",
+        help="Normalize work types while loading with the rules in FILE "
+             "(default: config/work-type-rules.json)"
+    )
+    parser.add_argument(
+        "--no-normalize",
+        action="store_true",
+        help="Keep source work types as they are"
+    )
 
     args = parser.parse_args()
 
+    normalizer = None
+    if not args.no_normalize:
+        normalizer = load_rules(args.work_type_rules)
+        print(f"Normalizing work types with {os.path.basename(args.work_type_rules)}")
+
     print("Loading all JSON files...")
-    all_entries = load_all_json_files(include_batches=args.batches)
+    all_entries, fingerprints = load_all_json_files(
+        include_batches=args.batches,
+        cache_file=args.cache_file if args.incremental else None,
+        workers=args.jobs,
+        decode_processes=args.decode_processes,
+        compact=args.compact,
+        normalizer=normalizer
+    )
     print(f"Loaded {len(all_entries)} total entries from all files")
 
     print("\nRemoving identical duplicates...")
-    all_entries = remove_identical_duplicates(all_entries)
+    all_entries = remove_identical_duplicates(all_entries, fingerprints)
+    del fingerprints
     print(f"Remaining after deduplication: {len(all_entries)} entries")
 
+    print("\nValidating entries against the schema...")
+    invalid_count, violation_counts, seconds = summarize_violations(all_entries)
+    print(f"Validated {len(all_entries)} entries in {seconds * 1000:.1f} ms: "
+          f"{invalid_count} entries with schema violations")
+    for (kind, field), count in violation_counts.most_common(10):
+        print(f"  {kind} {field}: {count}")
+
     print("\nFiltering entries...")
-    valid, invalid, incomplete, multi_work, duplicates = filter_entries(all_entries)
+    valid, invalid, incomplete, multi_work, duplicates = filter_entries(all_entries, strict=args.strict)
 
     print("\nSaving filtered results...")
-    save_json(valid, "ai-character-db.json")
-    save_json(invalid, "invalid-entries.json")
-    save_json(incomplete, "incomplete-entries.json", add_missing=True)
-    save_json(multi_work, "multi-work-entries.json")
-    save_json(duplicates, "duplicate-entries.json")
+    db = character_db.connect(args.sqlite) if args.sqlite else None
+    outputs = [
+        (valid, "ai-character-db.json", False),
+        (invalid, "invalid-entries.json", False),
+        (incomplete, "incomplete-entries.json", True),
+        (multi_work, "multi-work-entries.json", False),
+        (duplicates, "duplicate-entries.json", False),
+    ]
+    # The files are written concurrently; a SQLite connection can only be
+    # used from the thread that opened it
+    results = run_concurrently(
+        [partial(save_json, entries, filename, add_missing, db, verbose=False,
+                 standardized=normalizer is not None)
+         for entries, filename, add_missing in outputs],
+        max_workers=1 if db is not None else WRITE_THREADS)
+    for (_, filename, _), (saved, _) in zip(outputs, results):
+        print(f"Saved {len(saved)} entries to {filename}")
+    saved_valid, saved_metadata = results[0]
+    if db is not None:
+        db.close()
+        print(f"Stored all results in {args.sqlite}")
 
     print("\n=== Summary ===")
     print(f"Total entries processed: {len(all_entries)}")
@@ -462,28 +1024,18 @@ def main():
     print(f"Multi-work entries: {len(multi_work)}")
     print(f"Duplicate entries: {len(duplicates)}")
 
+    if not args.no_split:
+        # Split the valid entries by work type straight from memory
+        print("\n=== Splitting JSON by work type ===")
+        try:
+            split_characters(saved_valid, saved_metadata, "data", compact=args.compact_shards,
+                             max_entries=args.max_entries, max_bytes=args.max_bytes,
+                             coalesce_below=args.coalesce_below)
+        except OSError as e:
+            print(f"Error running split step: {e}", file=sys.stderr)
 
-if __name__ == "__main__":
-    import subprocess
-    import sys
+    report_peak_memory()
 
-    main()
 
-    # After merging, automatically split the JSON by work type
-    print("\n=== Splitting JSON by work type ===")
-    try:
-        result = subprocess.run(
-            [sys.executable, "split_json_by_work_type.py"],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        print(result.stdout)
-        if result.stderr:
-            print("Warnings:", result.stderr, file=sys.stderr)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running split script: {e}", file=sys.stderr)
-        print(e.stdout)
-        print(e.stderr, file=sys.stderr)
-    except FileNotFoundError:
-        print("Warning: split_json_by_work_type.py not found. Skipping split step.", file=sys.stderr)
+if __name__ == "__main__":
+    main()
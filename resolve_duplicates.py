@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
 """
 Script to resolve duplicate entries in duplicate-entries.json.
-For each pair of duplicates, merges the best information from both entries.
+For each group of duplicates, merges the best information from all entries.
+
+Usage:
+    python3 resolve_duplicates.py [INPUT] [-o OUTPUT]
+
+INPUT defaults to duplicate-entries.json and can be any character database
+file, including ai-character-db.json. OUTPUT defaults to INPUT.
 """
 
-import json
-from typing import List, Dict, Any
+import argparse
+import time
+from typing import List, Dict, Any, Tuple
+
+from character_stream import CharacterStream, CharacterWriter
 
 def is_better_field(val1: Any, val2: Any, field_name: str) -> bool:
     """
@@ -29,102 +38,162 @@ def is_better_field(val1: Any, val2: Any, field_name: str) -> bool:
     # Default to first value
     return True
 
-def merge_entries(entry1: Dict[str, Any], entry2: Dict[str, Any]) -> Dict[str, Any]:
+def merge_urls(url_lists: List[Any]) -> List[str]:
     """
-    Merges two duplicate entries, keeping the best information from each.
+    Unions source URL lists, keeping each URL at its first position.
     """
     merged = {}
+    for urls in url_lists:
+        if urls:
+            merged.update(dict.fromkeys(urls))
+    return list(merged)
 
-    # Get all unique keys from both entries
-    all_keys = set(entry1.keys()) | set(entry2.keys())
-
-    for key in all_keys:
-        val1 = entry1.get(key)
-        val2 = entry2.get(key)
+def merge_group(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merges any number of duplicate entries in one pass, keeping the best
+    information from each.
+
+    The result is the same as folding the entries pairwise through
+    merge_entries: for each field the first non-empty value wins unless a
+    later string is longer (descriptions and explanations) or longer once
+    stripped (other text fields). source_urls is the union of all URLs in
+    first-seen order. Fields appear in the order they are first seen.
+    """
+    # Field order of the first entry, then any fields only later entries have
+    keys = {}
+    for entry in entries:
+        keys.update(dict.fromkeys(entry))
 
-        # Special handling for source_urls - merge unique URLs
+    merged = {}
+    for key in keys:
+        values = [entry.get(key) for entry in entries]
         if key == 'source_urls':
-            merged[key] = list(set(val1 + val2)) if val1 and val2 else (val1 or val2 or [])
-        # For other fields, pick the better one
-        elif is_better_field(val1, val2, key):
-            merged[key] = val1 if val1 else val2
-        else:
-            merged[key] = val2 if val2 else val1
+            merged[key] = merge_urls(values)
+            continue
+
+        present = [value for value in values if value]
+        if not present:
+            # All values empty: like the pairwise fold, keep the last entry's value
+            merged[key] = values[-1]
+            continue
+
+        best = present[0]
+        if len(present) > 1 and isinstance(best, str):
+            # Text values: the first of the longest wins; other values never replace text
+            if 'description' in key or 'explanation' in key:
+                best_length = len(best)
+                for value in present[1:]:
+                    if isinstance(value, str) and len(value) > best_length:
+                        best, best_length = value, len(value)
+            else:
+                best_length = len(best.strip())
+                for value in present[1:]:
+                    if isinstance(value, str) and len(value.strip()) > best_length:
+                        best, best_length = value, len(value.strip())
+        merged[key] = best
 
     return merged
 
+def merge_entries(entry1: Dict[str, Any], entry2: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merges two duplicate entries, keeping the best information from each.
+    """
+    return merge_group([entry1, entry2])
+
+def get_duplicate_key(char: Dict[str, Any]) -> Tuple[Any, Any]:
+    return (char.get('work_name', ''), char.get('character_name', ''))
+
+def index_duplicates(characters: List[Dict[str, Any]]) -> Dict[Tuple[Any, Any], List[int]]:
+    """
+    Maps each (work_name, character_name) key to the positions of its
+    entries, in one pass over the characters.
+    """
+    positions = {}
+    for i, char in enumerate(characters):
+        positions.setdefault(get_duplicate_key(char), []).append(i)
+    return positions
+
 def group_duplicates(characters: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
     """
     Groups duplicate entries based on work_name and character_name.
     Returns list of lists, where each inner list contains duplicate entries.
     """
-    groups = {}
-
-    for char in characters:
-        key = (char.get('work_name', ''), char.get('character_name', ''))
-        if key not in groups:
-            groups[key] = []
-        groups[key].append(char)
-
     # Return groups that have more than one entry (duplicates)
-    return [group for group in groups.values() if len(group) > 1]
+    return [[characters[i] for i in group]
+            for group in index_duplicates(characters).values() if len(group) > 1]
 
-def resolve_duplicates(input_file: str, output_file: str):
+def resolve_characters(characters: List[Dict[str, Any]], verbose: bool = True) -> Tuple[List[Dict[str, Any]], int]:
     """
-    Reads duplicate-entries.json, resolves duplicates by merging,
-    and writes the result back.
+    Replaces every group of duplicates with its merged entry, at the position
+    of the group's first entry. Returns (resolved characters, number of groups).
     """
-    # Read the input file
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    characters = data['characters']
-    print(f"Total entries before deduplication: {len(characters)}")
-
-    # Group duplicates
-    duplicate_groups = group_duplicates(characters)
-    print(f"Found {len(duplicate_groups)} groups of duplicates")
-
-    # Merge each group of duplicates
-    merged_characters = []
-    processed_indices = set()
-
-    for i, char in enumerate(characters):
-        if i in processed_indices:
+    positions = index_duplicates(characters)
+    groups = sum(1 for group in positions.values() if len(group) > 1)
+    resolved = []
+
+    # Walk the keys in order of first appearance, which is the output order
+    for key, group in positions.items():
+        if len(group) == 1:
+            resolved.append(characters[group[0]])
             continue
 
-        # Find if this character has duplicates
-        key = (char.get('work_name', ''), char.get('character_name', ''))
-        duplicates = [c for c in characters if (c.get('work_name', ''), c.get('character_name', '')) == key]
-
-        if len(duplicates) > 1:
-            # Mark all indices as processed
-            for c in duplicates:
-                idx = characters.index(c)
-                processed_indices.add(idx)
+        duplicates = [characters[i] for i in group]
+        resolved.append(merge_group(duplicates))
+        if verbose:
+            print(f"Merged {len(duplicates)} entries for: {key[1]} from {key[0]}")
 
-            # Merge all duplicates
-            merged = duplicates[0]
-            for dup in duplicates[1:]:
-                merged = merge_entries(merged, dup)
+    return resolved, groups
 
-            merged_characters.append(merged)
-            print(f"Merged {len(duplicates)} entries for: {char.get('character_name')} from {char.get('work_name')}")
-        else:
-            processed_indices.add(i)
-            merged_characters.append(char)
+def resolve_duplicates(input_file: str, output_file: str, verbose: bool = True):
+    """
+    Reads a character database file (duplicate-entries.json by default),
+    resolves duplicates by merging, and writes the result.
+    """
+    # Read the input file
+    stream = CharacterStream(input_file)
+    characters = list(stream)
+    print(f"Total entries before deduplication: {len(characters)}")
 
+    start = time.perf_counter()
+    merged_characters, groups = resolve_characters(characters, verbose)
+    elapsed = time.perf_counter() - start
+    print(f"Found {groups} groups of duplicates (resolved in {elapsed * 1000:.1f} ms)")
     print(f"Total entries after deduplication: {len(merged_characters)}")
 
     # Update metadata
-    data['characters'] = merged_characters
-    data['metadata']['total_entries'] = len(merged_characters)
+    header = stream.header
+    trailer = stream.trailer
+    if 'metadata' in trailer:
+        trailer['metadata']['total_entries'] = len(merged_characters)
+    else:
+        header.setdefault('metadata', {})['total_entries'] = len(merged_characters)
 
     # Write output
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    with CharacterWriter(output_file, header=header) as writer:
+        writer.write_all(merged_characters)
+        writer.commit(trailer=trailer)
 
     print(f"Wrote deduplicated entries to {output_file}")
 
 if __name__ == '__main__':
-    resolve_duplicates('duplicate-entries.json', 'duplicate-entries.json')
+    parser = argparse.ArgumentParser(
+        description="Merge duplicate character entries (same work_name and character_name)."
+    )
+    parser.add_argument(
+        "input",
+        nargs="?",
+        default="duplicate-entries.json",
+        help="Character database file to resolve (default: duplicate-entries.json)"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        help="File to write the resolved entries to (default: overwrite the input)"
+    )
+    parser.add_argument(
+        "-q", "--quiet",
+        action="store_true",
+        help="Don't print a line for every merged group"
+    )
+    args = parser.parse_args()
+
+    resolve_duplicates(args.input, args.output or args.input, verbose=not args.quiet)
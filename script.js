@@ -1,5 +1,8 @@
 let allCharacters = [];
 let appVersion = null;
+
+// Precomputed statistics crosstab (data/stats.json), if loaded
+let precomputedStats = null;
 let filters = {
     sortBy: 'benevolence',
     aiQualification: {
@@ -115,8 +118,9 @@ function getAlignment(character) {
     return character.alignment_rating || 'N/A';
 }
 
-// Update loading progress
-function updateLoadingProgress(loaded, total, workType = '') {
+// Update loading progress (fraction overrides loaded/total for the percentage,
+// e.g. to weight files by their byte size)
+function updateLoadingProgress(loaded, total, workType = '', fraction = null) {
     // Update main progress indicators
     const progressFill = document.getElementById('progress-fill');
     const progressText = document.getElementById('progress-text');
@@ -127,7 +131,7 @@ function updateLoadingProgress(loaded, total, workType = '') {
     const chartProgressText = document.getElementById('chart-progress-text');
     const chartLoadingText = document.querySelector('#chart-loading .loading-text');
 
-    const percentage = Math.round((loaded / total) * 100);
+    const percentage = Math.round((fraction !== null ? fraction : loaded / total) * 100);
 
     console.log(`Progress: ${loaded}/${total} (${percentage}%) - ${workType}`);
 
@@ -182,6 +186,57 @@ async function fetchWithVersion(url) {
     return fetch(versionedUrl);
 }
 
+// Fields stored once per work in compact shards, and fields whose values are
+// string table indexes (see encode_compact_shard in split_json_by_work_type.py)
+const WORK_FIELDS = ['work_type', 'work_name', 'work_url', 'publication_year'];
+const CODED_FIELDS = new Set([
+    'work_type', 'work_url', 'character_type',
+    'ai_qualification', 'benevolence_rating', 'alignment_rating'
+]);
+
+// Return the character entries of a work type file, decoding the compact format
+function decodeShard(data) {
+    if (data.format !== 'compact') {
+        return Array.isArray(data.characters) ? data.characters : [];
+    }
+
+    const strings = data.strings;
+    const works = data.works.map(work => {
+        const fields = {};
+        WORK_FIELDS.forEach((field, i) => {
+            const value = work[i];
+            fields[field] = CODED_FIELDS.has(field) && value !== null ? strings[value] : value;
+        });
+        return fields;
+    });
+
+    return data.characters.map(row => {
+        // Entries that don't fit the format are stored as plain objects
+        if (!Array.isArray(row)) {
+            return row;
+        }
+
+        const work = works[row[1]];
+        const entry = {};
+        let next = 2;
+        for (const field of data.layouts[row[0]]) {
+            if (field in work) {
+                entry[field] = work[field];
+                continue;
+            }
+            const value = row[next++];
+            if (field === 'source_urls') {
+                entry[field] = value.map(index => strings[index]);
+            } else if (CODED_FIELDS.has(field)) {
+                entry[field] = strings[value];
+            } else {
+                entry[field] = value;
+            }
+        }
+        return entry;
+    });
+}
+
 // Load JSON data progressively
 async function loadData() {
     try {
@@ -198,59 +253,79 @@ async function loadData() {
         const manifestResponse = await fetchWithVersion('data/manifest.json');
         const manifest = await manifestResponse.json();
 
-        const workTypes = manifest.work_types || [];
-        const totalFiles = workTypes.length;
+        // Data files in load order. Manifests from before paging list one
+        // file per work type under work_types.
+        const files = manifest.files || (manifest.work_types || []).map(info => ({
+            ...info,
+            work_types: [info.work_type]
+        }));
+        const totalFiles = files.length;
         let loadedFiles = 0;
 
+        // Weight progress by file size when the manifest records it
+        const totalBytes = files.reduce((sum, info) => sum + (info.size || 0), 0);
+        let loadedBytes = 0;
+        const progressFraction = () => totalBytes > 0 ? loadedBytes / totalBytes : null;
+
         // Update last updated date from metadata
         if (manifest.metadata && manifest.metadata.last_updated) {
             document.getElementById('last-updated').textContent =
                 `Last updated: ${manifest.metadata.last_updated}`;
         }
 
-        // Load each work type file
+        // Fetch all files in parallel. The entries of the first file to
+        // arrive are shown right away; the full list is assembled in
+        // manifest order once every file has loaded.
         allCharacters = [];
+        const fileCharacters = new Array(totalFiles).fill(null);
+        let firstPaint = null;
+
+        // The precomputed statistics cover all files, so the panel can be
+        // shown as soon as they arrive
+        precomputedStats = null;
+        const statsLoad = manifest.stats
+            ? fetchWithVersion(`data/${manifest.stats.filename}`)
+                .then(response => response.json())
+                .then(stats => {
+                    if (stats.total === manifest.total_characters) {
+                        precomputedStats = stats;
+                        showStatistics();
+                    }
+                })
+                .catch(error => console.error('Error loading statistics:', error))
+            : Promise.resolve();
 
-        for (const workTypeInfo of workTypes) {
-            const filename = workTypeInfo.filename;
-            const workType = workTypeInfo.work_type;
+        await Promise.all(files.map(async (fileInfo, index) => {
+            const filename = fileInfo.filename;
+            const label = (fileInfo.work_types || []).join(', ');
 
             try {
                 const response = await fetchWithVersion(`data/${filename}`);
                 const data = await response.json();
+                fileCharacters[index] = decodeShard(data);
 
-                // Add characters from this file
-                if (data.characters && Array.isArray(data.characters)) {
-                    allCharacters = allCharacters.concat(data.characters);
+                if (!firstPaint) {
+                    allCharacters = fileCharacters[index];
+                    firstPaint = displayEntries();
                 }
-
-                loadedFiles++;
-                updateLoadingProgress(loadedFiles, totalFiles, workType);
-
             } catch (error) {
                 console.error(`Error loading ${filename}:`, error);
-                loadedFiles++;
-                updateLoadingProgress(loadedFiles, totalFiles, workType);
             }
-        }
 
-        // All files loaded, update UI
-        updateStatistics();
-        updateChartColors();
-        updateChartFilterState();
-        await displayEntries();
+            loadedFiles++;
+            loadedBytes += fileInfo.size || 0;
+            updateLoadingProgress(loadedFiles, totalFiles, label, progressFraction());
+        }));
 
-        // Hide loading indicator and show chart
-        const chartLoading = document.getElementById('chart-loading');
-        if (chartLoading) {
-            chartLoading.style.display = 'none';
+        if (firstPaint) {
+            await firstPaint;
         }
+        await statsLoad;
+        allCharacters = [].concat(...fileCharacters.filter(characters => characters !== null));
 
-        // Show stats container
-        const statsContainer = document.getElementById('stats');
-        if (statsContainer) {
-            statsContainer.style.display = 'grid';
-        }
+        // All files loaded, update UI
+        showStatistics();
+        await displayEntries();
 
     } catch (error) {
         console.error('Error loading data:', error);
@@ -265,6 +340,25 @@ async function loadData() {
     }
 }
 
+// Fill in the statistics panel and show it in place of its loading indicator
+function showStatistics() {
+    updateStatistics();
+    updateChartColors();
+    updateChartFilterState();
+
+    // Hide loading indicator and show chart
+    const chartLoading = document.getElementById('chart-loading');
+    if (chartLoading) {
+        chartLoading.style.display = 'none';
+    }
+
+    // Show stats container
+    const statsContainer = document.getElementById('stats');
+    if (statsContainer) {
+        statsContainer.style.display = 'grid';
+    }
+}
+
 // Update chart cell colors based on sort mode
 function updateChartColors() {
     const chartCells = document.querySelectorAll('.chart-cell');
@@ -408,77 +502,77 @@ function updateFilterButtons() {
 }
 
 // Update statistics
-function updateStatistics() {
-    // Filter characters matching the AI qualification totals filter
-    const filteredCharacters = allCharacters.filter(c => {
-        // Check AI qualification totals filter
-        const aiQual = c.ai_qualification;
-        if (aiQual === 'Pass' && !filters.aiQualificationTotals.pass) return false;
-        if (aiQual === 'Ambiguous' && !filters.aiQualificationTotals.ambiguous) return false;
-        if (aiQual === 'Fail' && !filters.aiQualificationTotals.fail) return false;
-        if ((!aiQual || aiQual === 'N/A') && !filters.aiQualificationTotals.na) return false;
-
-        // Check unresearched filter
-        if (c.needs_research === true && !filters.aiQualificationTotals.unresearched) return false;
+// Whether entries count towards the statistics under the AI qualification totals filter
+function passesStatisticsFilter(aiQual, needsResearch) {
+    if (aiQual === 'Pass' && !filters.aiQualificationTotals.pass) return false;
+    if (aiQual === 'Ambiguous' && !filters.aiQualificationTotals.ambiguous) return false;
+    if (aiQual === 'Fail' && !filters.aiQualificationTotals.fail) return false;
+    if ((!aiQual || aiQual === 'N/A') && !filters.aiQualificationTotals.na) return false;
 
-        return true;
-    });
+    // Check unresearched filter
+    if (needsResearch && !filters.aiQualificationTotals.unresearched) return false;
+
+    return true;
+}
+
+// Count entries per benevolence and alignment rating, from the precomputed
+// crosstab when available, otherwise in one pass over the loaded entries.
+// Returns a function (benevolence, alignment) => count.
+function countRatings() {
+    const counts = {};
+    const add = (benevolence, alignment, count) => {
+        const key = `${benevolence}|${alignment}`;
+        counts[key] = (counts[key] || 0) + count;
+    };
+
+    if (precomputedStats) {
+        const dimension = name => precomputedStats.dimensions.indexOf(name);
+        const aiIndex = dimension('ai_qualification');
+        const researchIndex = dimension('needs_research');
+        const benevolenceIndex = dimension('benevolence_rating');
+        const alignmentIndex = dimension('alignment_rating');
+        for (const cell of precomputedStats.cells) {
+            if (passesStatisticsFilter(cell[aiIndex], cell[researchIndex])) {
+                add(cell[benevolenceIndex], cell[alignmentIndex], cell[cell.length - 1]);
+            }
+        }
+    } else {
+        for (const c of allCharacters) {
+            if (passesStatisticsFilter(c.ai_qualification, c.needs_research === true)) {
+                add(getBenevolence(c), getAlignment(c), 1);
+            }
+        }
+    }
+
+    return (benevolence, alignment) => counts[`${benevolence}|${alignment}`] || 0;
+}
+
+function updateStatistics() {
+    const count = countRatings();
 
     // Benevolent row
-    const benevolentAligned = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'Benevolent' && getAlignment(c) === 'Aligned'
-    ).length;
-    const benevolentNeutral = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'Benevolent' && getAlignment(c) === 'Ambiguous'
-    ).length;
-    const benevolentMisaligned = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'Benevolent' && getAlignment(c) === 'Misaligned'
-    ).length;
-    const benevolentNA = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'Benevolent' && getAlignment(c) === 'N/A'
-    ).length;
+    const benevolentAligned = count('Benevolent', 'Aligned');
+    const benevolentNeutral = count('Benevolent', 'Ambiguous');
+    const benevolentMisaligned = count('Benevolent', 'Misaligned');
+    const benevolentNA = count('Benevolent', 'N/A');
 
     // Ambiguous benevolence row
-    const neutralAligned = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'Ambiguous' && getAlignment(c) === 'Aligned'
-    ).length;
-    const neutralNeutral = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'Ambiguous' && getAlignment(c) === 'Ambiguous'
-    ).length;
-    const neutralMisaligned = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'Ambiguous' && getAlignment(c) === 'Misaligned'
-    ).length;
-    const neutralNA = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'Ambiguous' && getAlignment(c) === 'N/A'
-    ).length;
+    const neutralAligned = count('Ambiguous', 'Aligned');
+    const neutralNeutral = count('Ambiguous', 'Ambiguous');
+    const neutralMisaligned = count('Ambiguous', 'Misaligned');
+    const neutralNA = count('Ambiguous', 'N/A');
 
     // Malevolent row
-    const malevolentAligned = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'Malevolent' && getAlignment(c) === 'Aligned'
-    ).length;
-    const malevolentNeutral = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'Malevolent' && getAlignment(c) === 'Ambiguous'
-    ).length;
-    const malevolentMisaligned = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'Malevolent' && getAlignment(c) === 'Misaligned'
-    ).length;
-    const malevolentNA = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'Malevolent' && getAlignment(c) === 'N/A'
-    ).length;
+    const malevolentAligned = count('Malevolent', 'Aligned');
+    const malevolentNeutral = count('Malevolent', 'Ambiguous');
+    const malevolentMisaligned = count('Malevolent', 'Misaligned');
+    const malevolentNA = count('Malevolent', 'N/A');
 
     // N/A benevolence row
-    const naAligned = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'N/A' && getAlignment(c) === 'Aligned'
-    ).length;
-    const naNeutral = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'N/A' && getAlignment(c) === 'Ambiguous'
-    ).length;
-    const naMisaligned = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'N/A' && getAlignment(c) === 'Misaligned'
-    ).length;
-    const naNA = filteredCharacters.filter(c =>
-        getBenevolence(c) === 'N/A' && getAlignment(c) === 'N/A'
-    ).length;
+    const naAligned = count('N/A', 'Aligned');
+    const naNeutral = count('N/A', 'Ambiguous');
+    const naMisaligned = count('N/A', 'Misaligned');
+    const naNA = count('N/A', 'N/A');
 
     // Column totals
     const totalAligned = benevolentAligned + neutralAligned + malevolentAligned + naAligned;
@@ -2,33 +2,434 @@
 """
 Split ai-character-db.json into separate files by work type for progressive loading.
 Also generates a version.json file for cache busting.
+
+Runs are incremental and deterministic: a work type file is only rewritten
+when its content hash differs from the one in the existing manifest, files
+of work types that no longer exist are removed, and the cache busting
+version is derived from content alone. Re-running on unchanged data leaves
+every output byte-identical, so browsers keep their cached copies. Files
+are written several at a time from threads, each to a temporary file that
+atomically replaces the old one, so the site never serves a half-written
+file.
+
+Each work type file also gets precompressed siblings for static servers
+(e.g. nginx gzip_static): a .gz file, and a .zst file when the optional
+zstandard module is installed. Both are deterministic (no timestamp or
+file name in the header), so they only change when the content does. The
+raw and compressed sizes are recorded in the manifest.
+
+With --compact-shards the work type files use a compact wire format
+(see encode_compact_shard) instead of indented JSON. --max-entries and
+--max-bytes page large work types into several files, and --coalesce-below
+combines small work types into shared ones (see plan_pages).
 """
 
+import argparse
+import gzip
 import json
 import os
 import hashlib
+from collections import Counter
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 
+try:
+    import zstandard
+except ImportError:  # Optional: .zst files are only written when installed
+    zstandard = None
+
+from character_record import CharacterRecord, json_default
+from character_stream import CharacterStream, run_concurrently, write_atomic
+
 
 def generate_file_hash(content):
     """Generate a hash of the file content for cache busting."""
     return hashlib.md5(content.encode('utf-8')).hexdigest()[:8]
 
 
-def split_json_by_work_type(input_file='ai-character-db.json', output_dir='data'):
-    """Split the main JSON file into separate files by work type."""
+def load_previous_json(path):
+    """Load a JSON file written by an earlier run, or {} if missing or unreadable."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def file_hash_on_disk(path):
+    """Return the cache busting hash of an existing file, or None if it can't be read."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return generate_file_hash(f.read())
+    except (FileNotFoundError, UnicodeDecodeError):
+        return None
+
+
+def gzip_compress(data):
+    """Compress bytes with gzip, with a zero mtime so the output depends only on the input."""
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def zstd_compress(data):
+    """Compress bytes with zstd (single-threaded, so the output is deterministic)."""
+    return zstandard.ZstdCompressor(level=19).compress(data)
+
+
+# Precompressed variants: (encoding, file suffix, compressor or None if unavailable)
+ENCODINGS = [
+    ('gzip', '.gz', gzip_compress),
+    ('zstd', '.zst', zstd_compress if zstandard is not None else None),
+]
+
+
+def write_compressed(filepath, data, changed):
+    """Write the precompressed siblings of a work type file.
+
+    When the file itself is unchanged, an existing compressed file is kept
+    as is. A compressed file whose encoding is unavailable is removed, so a
+    server never serves one that is out of date. Returns the manifest
+    "encodings" entry: {encoding: {"filename": ..., "size": ...}}.
+    """
+    encodings = {}
+    for encoding, suffix, compress in ENCODINGS:
+        path = filepath + suffix
+        if compress is None:
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        if changed or not os.path.exists(path):
+            write_atomic(path, compress(data))
+        encodings[encoding] = {
+            'filename': os.path.basename(path),
+            'size': os.path.getsize(path)
+        }
+    return encodings
+
+
+COMPACT_FORMAT = 'compact'
+
+# Fields stored once per work in compact shards
+WORK_FIELDS = ('work_type', 'work_name', 'work_url', 'publication_year')
+
+# Fields whose string values are replaced by indexes into the string table
+# (source_urls: each URL in the list)
+CODED_FIELDS = frozenset({
+    'work_type',
+    'work_url',
+    'character_type',
+    'ai_qualification',
+    'benevolence_rating',
+    'alignment_rating',
+})
+
+
+def _fits_compact(entry):
+    """Whether every coded field of an entry holds strings, as the table requires."""
+    for field in CODED_FIELDS:
+        if field in entry and not isinstance(entry[field], str):
+            return False
+    if 'source_urls' in entry:
+        urls = entry['source_urls']
+        if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+            return False
+    return True
+
+
+def encode_compact_shard(header, characters):
+    """Encode a work type file in the compact wire format.
+
+    header holds the file's work_type (or work_types) and page fields.
+
+    {
+      "format": "compact", "work_type": ..., "character_count": ...,
+      "strings": [...],           # URLs and categorical values
+      "layouts": [[field, ...]],  # distinct key orders of the entries
+      "works": [[work_type, work_name, work_url, publication_year], ...],
+      "characters": [[layout, work, value, ...], ...]
+    }
+
+    Each character row holds the index of its layout and of its work, then
+    the values of its layout's fields that are not work fields, in order.
+    Coded fields (and the URLs in source_urls) are string table indexes, in
+    rows and works alike. A work field the entry doesn't have is null in its
+    work. Entries whose coded fields are not strings are stored verbatim as
+    objects. Decoding (decode_compact_shard, decodeShard in script.js)
+    restores every entry exactly, including its key order.
+    """
+    strings, string_index = [], {}
+    layouts, layout_index = [], {}
+    works, work_index = [], {}
+
+    def code(value):
+        index = string_index.get(value)
+        if index is None:
+            index = string_index[value] = len(strings)
+            strings.append(value)
+        return index
+
+    rows = []
+    for character in characters:
+        if not _fits_compact(character):
+            rows.append(character)
+            continue
+
+        layout = tuple(character)
+        if layout not in layout_index:
+            layout_index[layout] = len(layouts)
+            layouts.append(list(layout))
+
+        work = tuple(
+            (code(character[field]) if field in CODED_FIELDS else character[field])
+            if field in character else None
+            for field in WORK_FIELDS
+        )
+        if work not in work_index:
+            work_index[work] = len(works)
+            works.append(list(work))
+
+        row = [layout_index[layout], work_index[work]]
+        for field in layout:
+            if field in WORK_FIELDS:
+                continue
+            value = character[field]
+            if field == 'source_urls':
+                value = [code(url) for url in value]
+            elif field in CODED_FIELDS:
+                value = code(value)
+            row.append(value)
+        rows.append(row)
+
+    return {
+        'format': COMPACT_FORMAT,
+        **header,
+        'character_count': len(rows),
+        'strings': strings,
+        'layouts': layouts,
+        'works': works,
+        'characters': rows
+    }
+
+
+def decode_compact_shard(data):
+    """Return the character entries of a compact work type file."""
+    strings = data['strings']
+    works = [
+        {field: strings[value] if field in CODED_FIELDS and value is not None else value
+         for field, value in zip(WORK_FIELDS, work)}
+        for work in data['works']
+    ]
+
+    characters = []
+    for row in data['characters']:
+        if not isinstance(row, list):
+            characters.append(row)
+            continue
+        work = works[row[1]]
+        values = iter(row[2:])
+        character = {}
+        for field in data['layouts'][row[0]]:
+            if field in work:
+                character[field] = work[field]
+                continue
+            value = next(values)
+            if field == 'source_urls':
+                value = [strings[index] for index in value]
+            elif field in CODED_FIELDS:
+                value = strings[value]
+            character[field] = value
+        characters.append(character)
+    return characters
+
+
+def write_data_file(filepath, file_content, previous_hash):
+    """Write a data file and its compressed copies unless they are up to date.
+
+    The file is skipped when its hash matches previous_hash (from the
+    previous manifest) and the file on disk. The file itself is checked too,
+    since it may have been edited by hand or by other tools. Files are
+    replaced atomically (see write_atomic), so readers never see a
+    half-written file. Safe to call from several threads for different
+    files. Returns (written, manifest info with hash, size and encodings).
+    """
+    file_bytes = file_content.encode('utf-8')
+    file_hash = generate_file_hash(file_content)
+    stale = not (previous_hash == file_hash and file_hash_on_disk(filepath) == file_hash)
+    written = write_atomic(filepath, file_bytes) if stale else False
+    encodings = write_compressed(filepath, file_bytes, stale)
+    return written, {'hash': file_hash, 'size': len(file_bytes), 'encodings': encodings}
+
+
+def remove_data_file(filepath):
+    """Remove a data file and its compressed copies. Returns True if the file existed."""
+    existed = os.path.exists(filepath)
+    if existed:
+        os.remove(filepath)
+    for _, suffix, _ in ENCODINGS:
+        if os.path.exists(filepath + suffix):
+            os.remove(filepath + suffix)
+    return existed
+
+
+# Dimensions of the statistics crosstab, in cell order
+STATS_DIMENSIONS = ('work_type', 'ai_qualification', 'needs_research',
+                    'benevolence_rating', 'alignment_rating')
 
-    # Create output directory if it doesn't exist
-    Path(output_dir).mkdir(exist_ok=True)
 
-    # Load the main JSON file
-    print(f"Loading {input_file}...")
-    with open(input_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+def stats_value(value):
+    """Return a value usable as a crosstab key (lists and objects as their JSON)."""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return value
 
-    characters = data.get('characters', [])
-    metadata = data.get('metadata', {})
+
+def build_stats(characters):
+    """Count the entries per combination of STATS_DIMENSIONS.
+
+    Values are normalized the way script.js reads them: a missing or empty
+    ai_qualification, benevolence_rating or alignment_rating counts as
+    "N/A", and needs_research is true only if it is exactly true. Malformed
+    list or object values count as their JSON text, which, as in script.js,
+    matches no rating.
+
+    Returns {"dimensions": [...], "total": ..., "cells": [[values..., count]]}
+    with the non-empty cells in a fixed order.
+    """
+    counts = Counter()
+    for character in characters:
+        counts[(
+            stats_value(character.get('work_type', 'Other')),
+            stats_value(character.get('ai_qualification') or 'N/A'),
+            character.get('needs_research') is True,
+            stats_value(character.get('benevolence_rating') or 'N/A'),
+            stats_value(character.get('alignment_rating') or 'N/A'),
+        )] += 1
+
+    cells = sorted(counts.items(), key=lambda item: json.dumps(item[0], ensure_ascii=False))
+    return {
+        'dimensions': list(STATS_DIMENSIONS),
+        'total': len(characters),
+        'cells': [[*key, count] for key, count in cells]
+    }
+
+
+def split_json_by_work_type(input_file='ai-character-db.json', output_dir='data', db_file=None,
+                            compact=False, max_entries=0, max_bytes=0, coalesce_below=0):
+    """Split the main JSON file into separate files by work type.
+
+    If db_file is given, the main database is read from that SQLite
+    database (see character_db.py) instead of from input_file. The other
+    options are passed on to split_characters.
+    """
+
+    # Load the main database, holding entries as compact records
+    if db_file:
+        import character_db
+
+        print(f"Loading {character_db.MAIN_DOCUMENT} from {db_file}...")
+        conn = character_db.connect(db_file)
+        metadata, characters = character_db.load_document(conn, character_db.MAIN_DOCUMENT)
+        characters = [CharacterRecord.from_dict(character) for character in characters]
+        conn.close()
+    else:
+        print(f"Loading {input_file}...")
+        stream = CharacterStream(input_file)
+        characters = [CharacterRecord.from_dict(character) for character in stream]
+        metadata = stream.header.get('metadata', stream.trailer.get('metadata', {}))
+
+    return split_characters(characters, metadata, output_dir, compact,
+                            max_entries, max_bytes, coalesce_below)
+
+
+def safe_file_name(work_type):
+    """Create a safe file name stem from a work type (letters, digits and '-')."""
+    safe_name = work_type.lower().replace(' ', '-').replace('/', '-')
+    return ''.join(c for c in safe_name if c.isalnum() or c == '-')
+
+
+def entry_size(character, compact=False):
+    """Approximate number of bytes an entry takes up in a work type file."""
+    if compact:
+        return len(json.dumps(character, separators=(',', ':'), ensure_ascii=False,
+                              default=json_default).encode('utf-8'))
+    content = json.dumps(character, indent=2, ensure_ascii=False, default=json_default)
+    # Nested two levels deep in the file, every line is indented 4 more spaces
+    return len(content.encode('utf-8')) + 4 * (content.count('\n') + 1) + 2
+
+
+def plan_pages(work_type_groups, max_entries=0, max_bytes=0, coalesce_below=0, compact=False):
+    """Decide which entries go into which file.
+
+    Work types are taken in sorted order. A work type that fits within
+    max_entries and max_bytes (0: no limit) gets one file, {name}.json;
+    a larger one is paged into {name}.0.json, {name}.1.json, ... Work types
+    with fewer than coalesce_below entries are packed together, within the
+    same limits, into _combined.0.json, _combined.1.json, ... (the leading
+    underscore keeps these apart from work type names).
+
+    Returns a list of (filename, header, entries) in load order, where
+    header holds the file's work_type and page, or its work_types.
+    """
+    def fill(tagged):
+        # Greedily cut (work type, entry) pairs into runs within the limits
+        runs, run, run_bytes = [], [], 0
+        for item in tagged:
+            size = entry_size(item[1], compact) if max_bytes else 0
+            if run and ((max_entries and len(run) >= max_entries)
+                        or (max_bytes and run_bytes + size > max_bytes)):
+                runs.append(run)
+                run, run_bytes = [], 0
+            run.append(item)
+            run_bytes += size
+        if run:
+            runs.append(run)
+        return runs
+
+    def entries(run):
+        return [character for _, character in run]
+
+    pages = []
+    small = []
+    for work_type, chars in sorted(work_type_groups.items()):
+        if len(chars) < coalesce_below:
+            small.extend((work_type, character) for character in chars)
+            continue
+        runs = fill((work_type, character) for character in chars)
+        safe_name = safe_file_name(work_type)
+        if len(runs) == 1:
+            pages.append((f"{safe_name}.json", {'work_type': work_type}, entries(runs[0])))
+            continue
+        for number, run in enumerate(runs):
+            header = {'work_type': work_type, 'page': number}
+            pages.append((f"{safe_name}.{number}.json", header, entries(run)))
+
+    for number, run in enumerate(fill(small)):
+        work_types = list(dict.fromkeys(work_type for work_type, _ in run))
+        pages.append((f"_combined.{number}.json", {'work_types': work_types}, entries(run)))
+
+    return pages
+
+
+def split_characters(characters, metadata, output_dir='data', compact=False,
+                     max_entries=0, max_bytes=0, coalesce_below=0):
+    """Split character entries into separate files by work type.
+
+    Args:
+        characters: The main database's entries, in database order (dicts
+            or CharacterRecord objects)
+        metadata: The main database's metadata, copied into the manifest
+        output_dir: Directory for the work type files and manifest.json
+        compact: Write the work type files in the compact wire format
+            (minified, see encode_compact_shard) instead of indented JSON
+        max_entries, max_bytes, coalesce_below: Page large work types and
+            combine small ones (see plan_pages); 0 disables each
+
+    version.json is written to the current directory. Returns the manifest.
+    """
+
+    # Create output directory if it doesn't exist
+    Path(output_dir).mkdir(exist_ok=True)
 
     print(f"Total characters: {len(characters)}")
 
@@ -40,73 +441,184 @@ def split_json_by_work_type(input_file='ai-character-db.json', output_dir='data'
             work_type_groups[work_type] = []
         work_type_groups[work_type].append(character)
 
-    # Generate manifest with file info
+    # Hashes of the files the previous run wrote (manifests from before
+    # paging list them under work_types)
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    previous_manifest = load_previous_json(manifest_path)
+    previous_hashes = {
+        info.get('filename'): info.get('hash')
+        for key in ('work_types', 'files')
+        for info in previous_manifest.get(key, []) if isinstance(info, dict) and 'hash' in info
+    }
+
+    # Generate manifest with file info (generated_at is filled in below)
     manifest = {
         'metadata': metadata,
-        'generated_at': datetime.now().isoformat(),
+        'generated_at': None,
         'total_characters': len(characters),
-        'work_types': []
+        'work_types': [
+            {'work_type': work_type, 'character_count': len(chars), 'files': []}
+            for work_type, chars in sorted(work_type_groups.items())
+        ],
+        'files': []
     }
+    work_type_info = {info['work_type']: info for info in manifest['work_types']}
+    written = 0
 
-    # Write each work type to a separate file
-    print(f"\nSplitting into {len(work_type_groups)} work type files...")
-    for work_type, chars in sorted(work_type_groups.items()):
-        # Create a safe filename from work type
-        safe_name = work_type.lower().replace(' ', '-').replace('/', '-')
-        safe_name = ''.join(c for c in safe_name if c.isalnum() or c == '-')
-        filename = f"{safe_name}.json"
-        filepath = os.path.join(output_dir, filename)
+    pages = plan_pages(work_type_groups, max_entries, max_bytes, coalesce_below, compact)
 
+    def write_page(filename, header, chars):
         # Create the file content
-        file_data = {
-            'work_type': work_type,
-            'character_count': len(chars),
-            'characters': chars
-        }
-
-        file_content = json.dumps(file_data, indent=2, ensure_ascii=False)
+        if compact:
+            file_data = encode_compact_shard(header, chars)
+            file_content = json.dumps(file_data, separators=(',', ':'), ensure_ascii=False,
+                                      default=json_default)
+        else:
+            file_data = {
+                **header,
+                'character_count': len(chars),
+                'characters': chars
+            }
+            file_content = json.dumps(file_data, indent=2, ensure_ascii=False, default=json_default)
 
-        # Write the file
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(file_content)
+        # Write the file, unless the previous run already wrote this content
+        return write_data_file(os.path.join(output_dir, filename), file_content,
+                               previous_hashes.get(filename))
 
-        # Generate hash for this file
-        file_hash = generate_file_hash(file_content)
+    # Write each work type (or page) to a separate file, several at a time
+    print(f"\nSplitting {len(work_type_groups)} work types into {len(pages)} files...")
+    results = run_concurrently([partial(write_page, *page) for page in pages])
+    for (filename, header, chars), (changed, file_info) in zip(pages, results):
+        work_types = header.get('work_types', [header.get('work_type')])
+        status = "written" if changed else "unchanged"
+        written += changed
 
         # Add to manifest
-        manifest['work_types'].append({
-            'work_type': work_type,
+        manifest['files'].append({
             'filename': filename,
+            'work_types': work_types,
             'character_count': len(chars),
-            'hash': file_hash
+            **file_info
         })
+        for work_type in work_types:
+            work_type_info[work_type]['files'].append(filename)
 
-        print(f"  ✓ {work_type}: {len(chars)} characters → {filename}")
+        print(f"  ✓ {', '.join(work_types)}: {len(chars)} characters → {filename} ({status})")
 
-    # Write manifest file
-    manifest_path = os.path.join(output_dir, 'manifest.json')
-    with open(manifest_path, 'w', encoding='utf-8') as f:
-        json.dump(manifest, indent=2, fp=f, ensure_ascii=False)
+    # Remove files of work types (or pages) that no longer have any characters
+    current_files = {info['filename'] for info in manifest['files']}
+    removed = 0
+    for filename in sorted(previous_hashes):
+        if not isinstance(filename, str) or filename in current_files:
+            continue
+        if remove_data_file(os.path.join(output_dir, os.path.basename(filename))):
+            removed += 1
+            print(f"  ✗ Removed stale {filename}")
+
+    # Precompute the statistics panel's counts
+    stats_content = json.dumps(build_stats(characters), separators=(',', ':'), ensure_ascii=False)
+    previous_stats = previous_manifest.get('stats')
+    _, stats_info = write_data_file(os.path.join(output_dir, 'stats.json'), stats_content,
+                                    previous_stats.get('hash') if isinstance(previous_stats, dict) else None)
+    manifest['stats'] = {'filename': 'stats.json', **stats_info}
+
+    # Remove the search index shards written by earlier versions
+    previous_index = previous_manifest.get('search_index')
+    if isinstance(previous_index, dict):
+        for info in previous_index.get('files', []):
+            if isinstance(info, dict) and isinstance(info.get('filename'), str):
+                remove_data_file(os.path.join(output_dir, 'search',
+                                              os.path.basename(info['filename'])))
+        try:
+            os.rmdir(os.path.join(output_dir, 'search'))
+        except OSError:
+            pass
 
-    print(f"\n✓ Manifest written to {manifest_path}")
+    # The version depends only on content, never on when the split ran
+    content_manifest = {key: value for key, value in manifest.items() if key != 'generated_at'}
+    version = generate_file_hash(json.dumps(content_manifest, sort_keys=True))
+
+    # Keep the previous timestamps when nothing changed
+    previous_version = load_previous_json('version.json')
+    if previous_version.get('version') == version and previous_manifest.get('generated_at'):
+        manifest['generated_at'] = previous_manifest['generated_at']
+        timestamp = previous_version.get('timestamp', manifest['generated_at'])
+    else:
+        manifest['generated_at'] = datetime.now().isoformat()
+        timestamp = manifest['generated_at']
+
+    # Write manifest file
+    manifest_content = json.dumps(manifest, indent=2, ensure_ascii=False)
+    if write_atomic(manifest_path, manifest_content):
+        print(f"\n✓ Manifest written to {manifest_path}")
+    else:
+        print(f"\n✓ Manifest unchanged at {manifest_path}")
 
     # Generate version.json for cache busting
     version_data = {
-        'version': generate_file_hash(json.dumps(manifest)),
-        'timestamp': datetime.now().isoformat(),
+        'version': version,
+        'timestamp': timestamp,
         'last_updated': metadata.get('last_updated', ''),
         'data_version': manifest['generated_at']
     }
 
-    with open('version.json', 'w', encoding='utf-8') as f:
-        json.dump(version_data, indent=2, fp=f)
-
-    print(f"✓ Version file written to version.json")
+    if write_atomic('version.json', json.dumps(version_data, indent=2)):
+        print(f"✓ Version file written to version.json")
+    else:
+        print(f"✓ Version file unchanged")
     print(f"\nCache busting version: {version_data['version']}")
-    print(f"\nDone! Split {len(characters)} characters into {len(work_type_groups)} files.")
+
+    # Total transfer size of the work type files, raw and per encoding
+    raw_size = sum(info['size'] for info in manifest['files'])
+    sizes = [f"{raw_size:,} bytes"]
+    for encoding, _, compress in ENCODINGS:
+        if compress is not None:
+            size = sum(info['encodings'][encoding]['size'] for info in manifest['files'])
+            sizes.append(f"{encoding} {size:,} bytes ({size / max(raw_size, 1):.0%})")
+    print(f"Work type files: {', '.join(sizes)}")
+    print(f"\nDone! Split {len(characters)} characters into {len(pages)} files "
+          f"({written} written, {len(pages) - written} unchanged, {removed} removed).")
 
     return manifest
 
 
 if __name__ == '__main__':
-    split_json_by_work_type()
+    parser = argparse.ArgumentParser(
+        description="Split ai-character-db.json into work type files for progressive loading."
+    )
+    parser.add_argument(
+        "--sqlite",
+        metavar="DB",
+        help="Read the main database from this SQLite database instead of ai-character-db.json"
+    )
+    parser.add_argument(
+        "--compact-shards",
+        action="store_true",
+        help="Write the work type files in the compact wire format instead of indented JSON"
+    )
+    parser.add_argument(
+        "--max-entries",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Page work types with more than N characters into several files (default: 0, no limit)"
+    )
+    parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Page work types whose file would exceed about N bytes (default: 0, no limit)"
+    )
+    parser.add_argument(
+        "--coalesce-below",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Combine work types with fewer than N characters into shared files (default: 0, never)"
+    )
+    args = parser.parse_args()
+
+    split_json_by_work_type(db_file=args.sqlite, compact=args.compact_shards,
+                            max_entries=args.max_entries, max_bytes=args.max_bytes,
+                            coalesce_below=args.coalesce_below)
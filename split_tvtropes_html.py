@@ -1,63 +1,160 @@
 #!/usr/bin/env python3
 """
 Split TVTropes HTML files into manageable batches of ~50 lines each
+
+Usage:
+    python3 split_tvtropes_html.py [-j N] [--input-dir DIR] [--output-dir DIR]
+                                   [--max-chars N | --max-tokens N [--stable-ids]]
+                                   [--prune]
+
+Every page in cached-pages/ is read in a single forward pass that finds the
+examples boundaries, section headings and list items together, and pages are
+split in a pool of worker processes. Batches are written to
+batches/<page>/<page>-batch_NN.html; batch files whose content did not change
+are left untouched.
+
+With --max-chars or --max-tokens, batches are packed by size instead of line
+count: the examples are parsed with html.parser into whole top-level <li>
+examples (nested lists included), which are packed in order into as few
+batches as the budget allows.
+
+Each page's batches are recorded in batches/<page>/.manifest.json with the
+hash of the source page and of every batch, so a page that did not change
+since its last split is skipped, and a re-split reports which batches
+changed and which extraction results are out of date. With --stable-ids
+(which requires a budget), batches are named by a hash of their content
+(<page>-batch_<id>.html) and packed with content-defined boundaries, so
+editing a page changes only the batches around the edit and the others keep
+their names and their extraction results.
 """
+import argparse
+import glob
+import hashlib
+import html
+import io
+import json
 import os
 import re
-import glob
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from html.parser import HTMLParser
 from pathlib import Path
 
-# Get all HTML files in cached-pages directory
-input_dir = "cached-pages"
-html_files = glob.glob(f"{input_dir}/*.html")
+from character_stream import write_atomic
 
-base_dir = "batches"
+INPUT_DIR = "cached-pages"
+BASE_DIR = "batches"
 CHUNK_SIZE = 50
 
-print(f"Found {len(html_files)} HTML files to process\n")
+HR_MARKER = '<hr data-format=\'&#8212;&#8212;\' />'
+EXAMPLES_HEADER = '<h2>Examples:</h2>'
+# The closing </div> of the main content is the last one within this many
+# lines after a line mentioning article-content
+CONTENT_END_WINDOW = 20
+# Format: <div class="folderlabel" onclick="togglefolder('folder#');">&nbsp;&nbsp;&nbsp;&nbsp;Section Name&nbsp;</div>
+SECTION_NAME = re.compile(r'&nbsp;&nbsp;&nbsp;&nbsp;([^&<]+)&nbsp;')
 
-for input_file in sorted(html_files):
-    # Extract filename without extension and convert underscores to dashes
-    filename = Path(input_file).stem  # e.g., "tvtropes-benevolent_ai"
-    filename_normalized = filename.replace('_', '-')  # e.g., "tvtropes-benevolent-ai"
+# Rough characters per token of the extraction model, for --max-tokens
+CHARS_PER_TOKEN = 4
 
-    # Create output directory based on normalized filename
-    output_dir = f"{base_dir}/{filename_normalized}"
-    os.makedirs(output_dir, exist_ok=True)
+# Per-page record of the batches written, next to them. The leading dot keeps
+# it out of the "*.json" scans of the merge and standardization scripts.
+MANIFEST_FILE = ".manifest.json"
+# Hex digits of the content hash used as a batch id with --stable-ids
+BATCH_ID_LENGTH = 12
 
-    print(f"Processing: {filename}")
+BATCH_HEADER = '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n</head>\n<body>\n'
+BATCH_FOOTER = '\n</body>\n</html>\n'
 
-    with open(input_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
 
-    # Find all hr markers
-    hr_markers = []
-    for i, line in enumerate(lines):
-        if '<hr data-format=\'&#8212;&#8212;\' />' in line:
-            hr_markers.append(i)
+def expand_line(line, expanded):
+    """Append a line to expanded, split at </li><li> to get one entry per line."""
+    if '</li><li>' not in line:
+        expanded.append(line)
+        return
 
-    # Find the closing div tag for the main content
-    content_end = -1
-    for i in range(len(lines) - 1, -1, -1):
-        if '</div>' in lines[i] and 'article-content' in str(lines[max(0, i-20):i]):
-            content_end = i
-            break
+    # Split and preserve both the closing and opening tags
+    parts = line.split('</li><li>')
+    last = len(parts) - 1
+    for i, part in enumerate(parts):
+        if i == 0:
+            # First part: add closing tag back
+            expanded.append(part + '</li>\n')
+        elif i == last:
+            # Last part: add opening tag back
+            expanded.append('<li>' + part)
+        else:
+            # Middle parts: add both tags back
+            expanded.append('<li>' + part + '</li>\n')
 
-    if len(hr_markers) == 0:
-        print(f"  ✗ Could not find hr markers, skipping...")
-        print()
-        continue
 
-    # Check if this file has an Examples header (main pages) or not (subpages)
+def scan_page(lines):
+    """Scan a page's lines once, finding boundaries, sections and list items together.
+
+    Returns a dict with:
+        hr_markers: indices of the lines with an hr marker
+        examples_header: index of the first "Examples:" header line, or -1
+        content_end: index of the closing </div> of the main content, or -1
+        expanded: every line of the page, split at </li><li>
+        line_starts: for each line index, where it starts in expanded (plus
+            one final entry for the end of the page)
+        sections: (line index, expanded index, heading) of each section label
+    """
+    hr_markers = []
     examples_header = -1
+    content_end = -1
+    last_article_line = None
+    expanded = []
+    line_starts = []
+    sections = []
+
     for i, line in enumerate(lines):
-        if '<h2>Examples:</h2>' in line:
+        line_starts.append(len(expanded))
+
+        if HR_MARKER in line:
+            hr_markers.append(i)
+        if examples_header == -1 and EXAMPLES_HEADER in line:
             examples_header = i
-            break
+        # A </div> closes the main content if article-content appeared in
+        # the lines just before it (this line excluded); the last one wins
+        if ('</div>' in line and last_article_line is not None
+                and last_article_line >= i - CONTENT_END_WINDOW):
+            content_end = i
+        if 'article-content' in line:
+            last_article_line = i
+
+        # Section heading: extract the name from between the &nbsp; tags
+        if 'class="folderlabel"' in line and 'onclick="togglefolder' in line:
+            match = SECTION_NAME.search(line)
+            if match:
+                sections.append((i, len(expanded), match.group(1).strip()))
 
-    if examples_header != -1:
+        expand_line(line, expanded)
+
+    line_starts.append(len(expanded))
+    return {
+        "hr_markers": hr_markers,
+        "examples_header": examples_header,
+        "content_end": content_end,
+        "expanded": expanded,
+        "line_starts": line_starts,
+        "sections": sections,
+    }
+
+
+def find_examples(page):
+    """Return the (start, end) line range holding the examples, or an error message."""
+    hr_markers = page["hr_markers"]
+    content_end = page["content_end"]
+    line_count = len(page["line_starts"]) - 1
+
+    if len(hr_markers) == 0:
+        return "Could not find hr markers"
+
+    if page["examples_header"] != -1:
         # Main page format: Extract from Examples: header to the second hr marker
-        examples_start = examples_header
+        examples_start = page["examples_header"]
         examples_end = hr_markers[1] if len(hr_markers) > 1 else content_end
     elif len(hr_markers) == 2:
         # Subpage format with 2 markers: Extract between the first and second hr markers
@@ -66,57 +163,38 @@ for input_file in sorted(html_files):
     elif len(hr_markers) == 1:
         # Subpage format with 1 marker: Extract from the hr marker to the end of content
         examples_start = hr_markers[0]
-        examples_end = content_end if content_end != -1 else len(lines)
+        examples_end = content_end if content_end != -1 else line_count
     else:
-        print(f"  ✗ Unexpected format, skipping...")
-        print()
-        continue
+        return "Unexpected format"
 
-    # Extract only the examples content
-    content_lines = lines[examples_start:examples_end]
+    # Resolve the range as a slice of the lines would (content_end may be -1)
+    start, end, _ = slice(examples_start, examples_end).indices(line_count)
+    return start, max(start, end)
 
-    # Split long lines at </li><li> boundaries to get one entry per line
-    # Also track section headings while we're at it
-    expanded_lines = []
-    section_markers = []  # List of (line_index, section_heading) tuples
-    current_section = None
 
-    for line in content_lines:
-        # Check if this line contains a section heading
-        if 'class="folderlabel"' in line and 'onclick="togglefolder' in line:
-            # Extract section name from between &nbsp; tags
-            # Format: <div class="folderlabel" onclick="togglefolder('folder#');">&nbsp;&nbsp;&nbsp;&nbsp;Section Name&nbsp;</div>
-            match = re.search(r'&nbsp;&nbsp;&nbsp;&nbsp;([^&<]+)&nbsp;', line)
-            if match:
-                current_section = match.group(1).strip()
-                section_markers.append((len(expanded_lines), current_section))
-
-        # Split at </li><li> to separate list items
-        if '</li><li>' in line:
-            # Split and preserve both the closing and opening tags
-            parts = line.split('</li><li>')
-            for i, part in enumerate(parts):
-                if i == 0:
-                    # First part: add closing tag back
-                    expanded_lines.append(part + '</li>\n')
-                elif i == len(parts) - 1:
-                    # Last part: add opening tag back
-                    expanded_lines.append('<li>' + part)
-                else:
-                    # Middle parts: add both tags back
-                    expanded_lines.append('<li>' + part + '</li>\n')
-        else:
-            expanded_lines.append(line)
+def extract_examples(page, start, end):
+    """Return the expanded lines of a line range and its section markers.
 
-    content_lines = expanded_lines
+    Section markers are (index in the returned lines, heading) tuples, for
+    the section labels inside the range only.
+    """
+    first = page["line_starts"][start]
+    content_lines = page["expanded"][first:page["line_starts"][end]]
+    section_markers = [(index - first, heading) for line, index, heading in page["sections"]
+                       if start <= line < end]
+    return content_lines, section_markers
 
-    # Split into chunks of ~50 lines, but avoid splitting multiline entries
-    batch_num = 0
-    i = 0
 
+def batch_bounds(content_lines, chunk_size=CHUNK_SIZE):
+    """Yield the (start, end) of each batch of ~chunk_size lines.
+
+    Batches avoid splitting multiline entries: each one is extended to the
+    next safe split point (a line ending in </li> followed by a line starting
+    with <li>, outside nested lists), searching at most ~50 lines ahead.
+    """
+    i = 0
     while i < len(content_lines):
-        batch_num += 1
-        end_index = min(i + CHUNK_SIZE, len(content_lines))
+        end_index = min(i + chunk_size, len(content_lines))
 
         # If we haven't reached the end of content, find a safe split point
         if end_index < len(content_lines):
@@ -140,35 +218,427 @@ for input_file in sorted(html_files):
 
             # If we didn't find a split point within 50 lines, just use the original end_index
             if not found_split:
-                end_index = min(i + CHUNK_SIZE, len(content_lines))
-
-        chunk = content_lines[i:end_index]
-
-        # For batch 2+, determine the current section heading at the start of this batch
-        section_heading = None
-        if batch_num > 1:
-            # Find the most recent section marker before or at line i
-            for marker_line, marker_section in section_markers:
-                if marker_line <= i:
-                    section_heading = marker_section
-                else:
-                    break  # section_markers are in order, so we can stop
-
-        output_file = f"{output_dir}/{filename_normalized}-batch_{batch_num:02d}.html"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            # Write minimal HTML wrapper
-            f.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n</head>\n<body>\n')
-
-            # For batch 2+, add section heading at the start if we have one
-            if batch_num > 1 and section_heading:
-                f.write(f'<h3>Section: {section_heading}</h3>\n')
-
-            # Write chunk
-            f.writelines(chunk)
-            # Close HTML properly
-            f.write('\n</body>\n</html>\n')
+                end_index = min(i + chunk_size, len(content_lines))
 
+        yield i, end_index
         i = end_index
 
-    print(f"  ✓ Created {batch_num} batches ({len(content_lines)} lines total) in {output_dir}/")
+
+def section_at(section_markers, index):
+    """Return the heading of the most recent section marker at or before index."""
+    position = bisect_right([line for line, _ in section_markers], index)
+    return section_markers[position - 1][1] if position else None
+
+
+def line_batches(content_lines, section_markers):
+    """Return the bodies of a page's ~CHUNK_SIZE-line batches."""
+    bodies = []
+    for start, end in batch_bounds(content_lines):
+        body = ''.join(content_lines[start:end])
+        # For batch 2+, carry over the section heading at the start of this batch
+        section_heading = section_at(section_markers, start) if bodies else None
+        if section_heading:
+            body = f'<h3>Section: {section_heading}</h3>\n' + body
+        bodies.append(body)
+    return bodies
+
+
+class ExampleCollector(HTMLParser):
+    """Collect the top-level <li> examples of a page's examples HTML.
+
+    Each example is recorded as (section heading, start offset, end offset)
+    into the source, spanning from its <li> to its </li> with any nested
+    lists. An example left open is closed by the next sibling <li>, by the end
+    of its list or by the end of the source. Section headings come from the
+    folder labels (<div class="folderlabel">) before the examples.
+    """
+
+    def __init__(self, source):
+        super().__init__(convert_charrefs=True)
+        self.source = source
+        # HTMLParser.getpos() counts lines by "\n" only, unlike str.splitlines()
+        self.line_offsets = [0]
+        for line in source.split('\n'):
+            self.line_offsets.append(self.line_offsets[-1] + len(line) + 1)
+        self.examples = []
+        self.section = None
+        self._label = None
+        self._stack = []  # open ul, ol and li elements
+        self._start = None  # offset of the open top-level example
+
+    def _offset(self):
+        line, column = self.getpos()
+        return self.line_offsets[line - 1] + column
+
+    def _end(self, offset):
+        # An example closes when no <li> is open any more
+        if self._start is not None and 'li' not in self._stack:
+            self.examples.append((self.section, self._start, offset))
+            self._start = None
+
+    def _pop(self, tag):
+        # Close tag and everything opened inside it (tolerating stray end tags)
+        if tag in self._stack:
+            del self._stack[len(self._stack) - 1 - self._stack[::-1].index(tag):]
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'div' and 'folderlabel' in (dict(attrs).get('class') or '').split():
+            self._label = []
+        elif tag == 'li':
+            if self._stack and self._stack[-1] == 'li':
+                # Implicitly closes the previous sibling
+                self._stack.pop()
+                self._end(self._offset())
+            if 'li' not in self._stack:
+                self._start = self._offset()
+            self._stack.append('li')
+        elif tag in ('ul', 'ol'):
+            self._stack.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'div' and self._label is not None:
+            heading = ''.join(self._label).strip()
+            if heading:
+                self.section = heading
+            self._label = None
+        elif tag == 'li':
+            self._pop('li')
+            self._end(self.source.index('>', self._offset()) + 1)
+        elif tag in ('ul', 'ol'):
+            offset = self._offset()
+            self._pop(tag)
+            self._end(offset)
+
+    def handle_data(self, data):
+        if self._label is not None:
+            self._label.append(data)
+
+    def close(self):
+        super().close()
+        self._stack = []
+        self._end(len(self.source))
+
+
+def collect_examples(source):
+    """Return the (section heading, html) of each top-level example in source."""
+    collector = ExampleCollector(source)
+    collector.feed(source)
+    collector.close()
+    return [(section, source[start:end].strip())
+            for section, start, end in collector.examples]
+
+
+def section_heading_html(section):
+    """Return the heading line that names an example's section in a batch."""
+    return f'<h3>Section: {html.escape(section, quote=False)}</h3>\n'
+
+
+def pack_examples(examples, max_chars):
+    """Pack examples in order into as few batches as max_chars allows.
+
+    A batch's size counts each example plus a section heading before its
+    first example and wherever the section changes, so every batch says which
+    section its examples come from. Batches are filled greedily, which for
+    batches of consecutive examples gives the fewest batches. An example
+    larger than the budget on its own gets a batch to itself.
+    Returns a list of batches, each a list of (section, html) examples.
+    """
+    batches = []
+    batch, size, section = [], 0, None
+    for example in examples:
+        heading = section_heading_html(example[0]) if example[0] else ''
+        added = len(example[1]) + 1 + (len(heading) if example[0] != section else 0)
+        if batch and size + added > max_chars:
+            batches.append(batch)
+            batch, size = [], 0
+            added = len(example[1]) + 1 + len(heading)
+        batch.append(example)
+        size += added
+        section = example[0]
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def cut_after(example, max_chars):
+    """Whether a content-defined batch boundary follows an example.
+
+    The example's hash is compared against a threshold proportional to its
+    size, so there is a cut about every max_chars / 2 characters on average,
+    at places that depend only on the examples themselves.
+    """
+    digest = hashlib.sha256(example[1].encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') < 2 * len(example[1]) / max_chars * 2 ** 64
+
+
+def pack_examples_stable(examples, max_chars):
+    """Pack examples in order into batches with content-defined boundaries.
+
+    Like pack_examples, but a batch also ends after an example for which
+    cut_after() holds, once it has reached a quarter of the budget. Since
+    those boundaries depend on the examples and not on their positions,
+    editing, adding or removing an example only changes the batches around
+    it, and the others keep their content (and so their ids). This takes
+    about half again as many batches as greedy packing.
+    """
+    batches = []
+    batch, size, section = [], 0, None
+    for example in examples:
+        heading = section_heading_html(example[0]) if example[0] else ''
+        added = len(example[1]) + 1 + (len(heading) if example[0] != section else 0)
+        if batch and size + added > max_chars:
+            batches.append(batch)
+            batch, size = [], 0
+            added = len(example[1]) + 1 + len(heading)
+        batch.append(example)
+        size += added
+        section = example[0]
+        if size >= max_chars // 4 and cut_after(example, max_chars):
+            batches.append(batch)
+            batch, size, section = [], 0, None
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def render_packed_batch(batch):
+    """Return the body of a batch of packed examples."""
+    parts = []
+    section = None
+    for example_section, example_html in batch:
+        if example_section and example_section != section:
+            parts.append(section_heading_html(example_section))
+        section = example_section
+        parts.append(example_html + '\n')
+    return ''.join(parts)
+
+
+def packed_batches(content_lines, max_chars, stable_ids=False):
+    """Return the bodies of a page's budget-packed batches and its example count."""
+    examples = collect_examples(''.join(content_lines))
+    pack = pack_examples_stable if stable_ids else pack_examples
+    return [render_packed_batch(batch) for batch in pack(examples, max_chars)], len(examples)
+
+
+def hash_text(text):
+    """Return the SHA-256 hex digest of a text's UTF-8 encoding."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def load_batch_manifest(output_dir):
+    """Load a page's batch manifest, or None if there is no usable one."""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else None
+    except (OSError, ValueError):
+        return None
+
+
+def batch_result(output_dir, batch_file):
+    """Return the path of a batch's extraction result (its .json sibling)."""
+    return os.path.join(output_dir, batch_file[:-len('.html')] + '.json')
+
+
+def report_stale_results(output_dir, filename_normalized, current, prune=False):
+    """Report (and with prune, delete) extraction results whose batch is gone."""
+    stale = sorted(os.path.join(output_dir, name) for name in os.listdir(output_dir)
+                   if name.startswith(f"{filename_normalized}-batch_") and name.endswith('.json')
+                   and name[:-len('.json')] + '.html' not in current)
+    if not stale:
+        return
+    if prune:
+        for result in stale:
+            os.remove(result)
+    action = "removed" if prune else "stale (remove with --prune)"
+    print(f"  ⚠ {len(stale)} extraction results {action}: "
+          f"{', '.join(os.path.basename(path) for path in stale)}")
+
+
+def write_batches(bodies, output_dir, filename_normalized, manifest, previous=None,
+                  stable_ids=False, prune=False):
+    """Write a page's batches and batch manifest, then report what changed.
+
+    Batches are named by number, or with stable_ids by a hash of their
+    content (<page>-batch_<id>.html), so a batch keeps its name, and its
+    extraction result <page>-batch_<id>.json stays valid, for as long as its
+    content doesn't change. Compared with the previous manifest, batches are
+    reported as new or changed (numbered batches whose content changed, so
+    that their extraction results are out of date). Batch files that are no
+    longer produced are removed; extraction results without a batch are
+    reported as stale and only removed with prune.
+    """
+    batches = []
+    for batch_num, body in enumerate(bodies, 1):
+        digest = hash_text(body)
+        if stable_ids:
+            batch_file = f"{filename_normalized}-batch_{digest[:BATCH_ID_LENGTH]}.html"
+        else:
+            batch_file = f"{filename_normalized}-batch_{batch_num:02d}.html"
+        write_atomic(os.path.join(output_dir, batch_file), BATCH_HEADER + body + BATCH_FOOTER)
+        batches.append({"file": batch_file, "sha256": digest, "chars": len(body)})
+    manifest["batches"] = batches
+    write_atomic(os.path.join(output_dir, MANIFEST_FILE),
+                 json.dumps(manifest, indent=2, ensure_ascii=False) + '\n')
+
+    # Batch files of earlier runs that were not produced this time
+    current = {batch["file"] for batch in batches}
+    stale = sorted(name for name in os.listdir(output_dir)
+                   if name.startswith(f"{filename_normalized}-batch_") and name.endswith('.html')
+                   and name not in current)
+    for name in stale:
+        os.remove(os.path.join(output_dir, name))
+
+    if previous is not None or stale:
+        report_changes(output_dir, batches, previous, len(stale))
+    report_stale_results(output_dir, filename_normalized, current, prune)
+
+
+def report_changes(output_dir, batches, previous, removed):
+    """Report how a page's batches compare with its previous manifest."""
+    known = {batch.get("file"): batch.get("sha256") for batch in (previous or {}).get("batches", [])}
+    changed = [batch["file"] for batch in batches
+               if batch["file"] in known and known[batch["file"]] != batch["sha256"]]
+    new = sum(1 for batch in batches if batch["file"] not in known)
+    print(f"  ↻ {len(batches) - new - len(changed)} unchanged, {len(changed)} changed, "
+          f"{new} new, {removed} removed")
+    outdated = [batch_result(output_dir, name) for name in changed
+                if os.path.exists(batch_result(output_dir, name))]
+    if outdated:
+        print(f"  ⚠ {len(outdated)} extraction results are out of date (their batch changed): "
+              f"{', '.join(os.path.basename(path) for path in outdated)}")
+
+
+def split_page(input_file, base_dir=BASE_DIR, max_chars=0, stable_ids=False, prune=False):
+    """Split one cached page into batch files, printing a short report.
+
+    With max_chars, batches are packed by size (see packed_batches) instead
+    of cut every ~CHUNK_SIZE lines. stable_ids requires max_chars, since line
+    batches have no content-defined boundaries. A page whose content and
+    settings match its batch manifest is not split again. Returns the number
+    of batches (0 if the page was skipped).
+    """
+    if stable_ids and not max_chars:
+        raise ValueError("stable_ids requires a max_chars budget")
+
+    # Extract filename without extension and convert underscores to dashes
+    filename = Path(input_file).stem  # e.g., "tvtropes-benevolent_ai"
+    filename_normalized = filename.replace('_', '-')  # e.g., "tvtropes-benevolent-ai"
+
+    # Create output directory based on normalized filename
+    output_dir = f"{base_dir}/{filename_normalized}"
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Processing: {filename}")
+
+    with open(input_file, 'rb') as f:
+        data = f.read()
+    manifest = {
+        "page": filename_normalized,
+        "source_sha256": hashlib.sha256(data).hexdigest(),
+        "settings": ({"max_chars": max_chars} if max_chars else {"chunk_size": CHUNK_SIZE}),
+        "stable_ids": stable_ids,
+    }
+    previous = load_batch_manifest(output_dir)
+    if (previous is not None
+            and all(previous.get(key) == value for key, value in manifest.items())
+            and all(os.path.exists(os.path.join(output_dir, batch.get("file", "")))
+                    for batch in previous.get("batches", []))):
+        current = {batch.get("file") for batch in previous.get("batches", [])}
+        print(f"  ✓ Unchanged since the last split ({len(current)} batches) in {output_dir}/")
+        report_stale_results(output_dir, filename_normalized, current, prune)
+        print()
+        return len(current)
+
+    # Decoded as open() in text mode would, with universal newlines
+    page = scan_page(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8'))
+
+    examples = find_examples(page)
+    if isinstance(examples, str):
+        print(f"  ✗ {examples}, skipping...")
+        print()
+        return 0
+
+    content_lines, section_markers = extract_examples(page, *examples)
+    if max_chars:
+        bodies, example_count = packed_batches(content_lines, max_chars, stable_ids)
+        sizes = [len(body) for body in bodies]
+        print(f"  ✓ Created {len(bodies)} batches ({example_count} examples, "
+              f"{sum(sizes):,} chars total, largest {max(sizes, default=0):,} chars) in {output_dir}/")
+        oversized = sum(1 for size in sizes if size > max_chars)
+        if oversized:
+            print(f"  ⚠ {oversized} examples are larger than the budget of {max_chars:,} chars "
+                  f"and have a batch to themselves")
+    else:
+        bodies = line_batches(content_lines, section_markers)
+        print(f"  ✓ Created {len(bodies)} batches ({len(content_lines)} lines total) in {output_dir}/")
+
+    write_batches(bodies, output_dir, filename_normalized, manifest, previous, stable_ids, prune)
     print()
+    return len(bodies)
+
+
+def split_page_captured(input_file, **options):
+    """Run split_page in a worker, returning (batches written, printed report)."""
+    output = io.StringIO()
+    with redirect_stdout(output):
+        batches = split_page(input_file, **options)
+    return batches, output.getvalue()
+
+
+def split_pages(html_files, jobs=1, **options):
+    """Split pages with a pool of jobs workers, printing each page's report in order.
+
+    options are passed on to split_page.
+    """
+    if jobs <= 1 or len(html_files) <= 1:
+        for input_file in html_files:
+            split_page(input_file, **options)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(split_page_captured, input_file, **options)
+                   for input_file in html_files]
+        for future in futures:
+            print(future.result()[1], end="")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Split cached TVTropes pages into batches of list items for extraction."
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of pages to split in parallel (default: CPU count)")
+    parser.add_argument("--input-dir", default=INPUT_DIR,
+                        help=f"Directory of cached HTML pages (default: {INPUT_DIR})")
+    parser.add_argument("--output-dir", default=BASE_DIR,
+                        help=f"Directory to write the batches to (default: {BASE_DIR})")
+    budget = parser.add_mutually_exclusive_group()
+    budget.add_argument("--max-chars", type=int, default=0, metavar="N",
+                        help="Pack whole examples into batches of at most about N characters "
+                             "instead of ~50 lines")
+    budget.add_argument("--max-tokens", type=int, default=0, metavar="N",
+                        help=f"Like --max-chars, with a budget of about N tokens "
+                             f"({CHARS_PER_TOKEN} characters per token)")
+    parser.add_argument("--stable-ids", action="store_true",
+                        help="With --max-chars or --max-tokens, pack batches with content-defined "
+                             "boundaries and name them by a hash of their content, so unchanged "
+                             "batches keep their names and extraction results across re-splits")
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete the extraction results of batches that are no longer produced")
+    args = parser.parse_args()
+    max_chars = args.max_chars or args.max_tokens * CHARS_PER_TOKEN
+    if args.stable_ids and not max_chars:
+        parser.error("--stable-ids requires --max-chars or --max-tokens: "
+                     "the ~50-line batches have no content-defined boundaries")
+
+    # Get all HTML files in cached-pages directory
+    html_files = sorted(glob.glob(f"{args.input_dir}/*.html"))
+    print(f"Found {len(html_files)} HTML files to process\n")
+
+    split_pages(html_files, args.jobs, base_dir=args.output_dir, max_chars=max_chars,
+                stable_ids=args.stable_ids, prune=args.prune)
+
+
+if __name__ == "__main__":
+    main()
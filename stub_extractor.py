@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Stub extractor for extract_batches.py: turns every example of a TVTropes
+batch into a placeholder character entry, without calling any model.
+
+Usage:
+    python3 stub_extractor.py BATCH_HTML [OUTPUT_JSON]
+                              [--delay S] [--fail-rate P] [--invalid-rate P]
+
+Each top-level <li> example becomes one entry named after the work it links
+to, with "Ambiguous" ratings and needs_research set, so the result passes the
+schema checks. Without OUTPUT_JSON the result is written to stdout. The
+options simulate a slow or unreliable backend for testing the scheduler.
+
+The entries are placeholders, not real data: run the stub on a copy of the
+batches, never on batches/ itself before merging with --batches.
+"""
+
+import argparse
+import html
+import json
+import random
+import re
+import sys
+import time
+
+from split_tvtropes_html import collect_examples
+
+_TAG = re.compile(r'<[^>]+>')
+_LINK = re.compile(r'<a\b[^>]*\bhref=[\'"]([^\'"]*)[\'"][^>]*>(.*?)</a>', re.S)
+_WHITESPACE = re.compile(r'\s+')
+
+# Characters of an example's text kept as the description
+DESCRIPTION_LENGTH = 300
+
+
+def plain_text(fragment):
+    """Return the text of an HTML fragment with tags removed."""
+    return _WHITESPACE.sub(' ', html.unescape(_TAG.sub('', fragment))).strip()
+
+
+def placeholder_entry(section, example):
+    """Return a placeholder character entry for one example."""
+    link = _LINK.search(example)
+    if link:
+        href, work_name = link.group(1), plain_text(link.group(2))
+        path = href.split('/pmwiki.php/', 1)[-1].split('/')
+        work_type = path[0] if len(path) == 2 and path[0] != 'Main' else (section or "Unknown")
+        work_url = 'https://tvtropes.org' + href if href.startswith('/') else href
+    else:
+        work_name, work_type, work_url = "Unknown", section or "Unknown", ""
+    work_name = work_name or "Unknown"
+    explanation = "Placeholder from stub_extractor.py"
+    return {
+        "source_urls": [],
+        "work_url": work_url,
+        "work_type": work_type,
+        "work_name": work_name,
+        "character_name": f"AI of {work_name}",
+        "character_description": plain_text(example)[:DESCRIPTION_LENGTH] or work_name,
+        "ai_qualification": "Ambiguous",
+        "ai_qualification_explanation": explanation,
+        "benevolence_rating": "Ambiguous",
+        "benevolence_rating_explanation": explanation,
+        "alignment_rating": "Ambiguous",
+        "alignment_rating_explanation": explanation,
+        "needs_research": True,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Placeholder extractor for testing extract_batches.py."
+    )
+    parser.add_argument("batch", help="Batch HTML file")
+    parser.add_argument("output", nargs="?", help="Result JSON file (default: stdout)")
+    parser.add_argument("--delay", type=float, default=0.0, metavar="S",
+                        help="Seconds to wait before answering, like a remote backend")
+    parser.add_argument("--fail-rate", type=float, default=0.0, metavar="P",
+                        help="Probability of failing with exit status 1")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, metavar="P",
+                        help="Probability of writing an entry that violates the schema")
+    args = parser.parse_args()
+
+    with open(args.batch, 'r', encoding='utf-8') as f:
+        source = f.read()
+    time.sleep(args.delay)
+    if random.random() < args.fail_rate:
+        print("stub_extractor: simulated backend failure", file=sys.stderr)
+        sys.exit(1)
+
+    characters = [placeholder_entry(section, example)
+                  for section, example in collect_examples(source)]
+    if characters and random.random() < args.invalid_rate:
+        characters[0]["ai_qualification"] = "Maybe"
+
+    text = json.dumps({"characters": characters}, indent=2, ensure_ascii=False) + '\n'
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+
+if __name__ == "__main__":
+    main()
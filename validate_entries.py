@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Validate character entries against the schema without merging anything.
+
+Checks every entry of the given JSON files (or of all files under the given
+directories) with the compiled schema validator from merge_json_files.py and
+reports every violation of every entry: unexpected fields, missing or empty
+required fields, wrong value types and values outside a rating's allowed set.
+Exits with status 1 if any entry has a violation, so it can gate new batches.
+
+Usage:
+    python3 validate_entries.py [PATH ...] [--summary]
+
+With no paths, validates all JSON files under batches/.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from character_stream import iter_characters
+from merge_json_files import validate_entry
+
+
+def find_files(paths):
+    """Expand the given files and directories into a sorted list of JSON files."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "**", "*.json"), recursive=True))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def describe_entry(index, entry):
+    """Return a short label for an entry in the report."""
+    if not isinstance(entry, dict):
+        return f"entry {index + 1}"
+    name = entry.get("character_name") or "?"
+    work = entry.get("work_name") or "?"
+    return f"entry {index + 1} ({name} from {work})"
+
+
+def validate_file(file_path, show_entries=True):
+    """Validate every entry of one file. Returns (entries, entries with violations, counts)."""
+    total = 0
+    invalid = 0
+    counts = Counter()
+
+    for index, entry in enumerate(iter_characters(file_path)):
+        total += 1
+        if isinstance(entry, dict):
+            violations = validate_entry(entry)
+        else:
+            violations = [("type", "<entry>", f"entry should be an object, got {type(entry).__name__}")]
+
+        if violations:
+            invalid += 1
+            counts.update((kind, field) for kind, field, _ in violations)
+            if show_entries:
+                print(f"{file_path}: {describe_entry(index, entry)}")
+                for _, _, message in violations:
+                    print(f"    - {message}")
+
+    return total, invalid, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate character entries against the schema (collection-guide.md v4.0)."
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        default=["batches"],
+        help="JSON files or directories to validate (default: batches)"
+    )
+    parser.add_argument(
+        "--summary",
+        action="store_true",
+        help="Only print violation counts, not every offending entry"
+    )
+
+    args = parser.parse_args()
+
+    files = find_files(args.paths)
+    start = time.perf_counter()
+    total = 0
+    invalid = 0
+    counts = Counter()
+    unreadable = 0
+
+    for file_path in files:
+        try:
+            file_total, file_invalid, file_counts = validate_file(file_path, not args.summary)
+        except (json.JSONDecodeError, UnicodeDecodeError, IOError) as e:
+            print(f"Warning: Could not load {file_path}: {e}")
+            unreadable += 1
+            continue
+        total += file_total
+        invalid += file_invalid
+        counts.update(file_counts)
+
+    elapsed = time.perf_counter() - start
+
+    print("\n=== Summary ===")
+    print(f"Files checked: {len(files)} ({unreadable} unreadable)")
+    print(f"Entries checked: {total} in {elapsed * 1000:.1f} ms")
+    print(f"Entries with violations: {invalid}")
+    for (kind, field), count in counts.most_common():
+        print(f"  {kind} {field}: {count}")
+
+    if invalid or unreadable:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
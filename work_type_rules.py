@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Work type normalization rules, compiled once into a fast normalizer.
+
+The rules live in config/work-type-rules.json and are shared by
+merge_json_files.py (which normalizes every entry as it is loaded) and
+apply_work_type_standardization.py (which rewrites existing files). Rules
+file format:
+
+    {
+      "fold_case": true,
+      "fold_whitespace": true,
+      "types": ["Anime", "Book", "Movie", ...],
+      "map": {"Film": "Movie", "Fanfic": "Fan Fiction", ...},
+      "split": {"separator": "/", "types": ["Manga/Anime", ...]},
+      "overrides": [
+        {"work_name": "Dragon Ball", "character_name": "Cell", "work_type": "Manga"},
+        ...
+      ]
+    }
+
+- types: the standard work types, kept as they are
+- map: non-standard work types and the standard type each one becomes
+- split: ambiguous combined types; the first part (the primary medium) is
+  kept and then normalized like any other work type
+- overrides: the work type of specific characters, applied before any other
+  rule (for ambiguous entries whose primary medium is not the first part)
+- fold_case / fold_whitespace: also match the types, map and split entries
+  regardless of case and of leading, trailing or repeated whitespace
+
+Work types no rule matches are left unchanged.
+"""
+
+import hashlib
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# Rules file used by default, in the config/ directory next to this module,
+# out of the way of the scripts that glob for character JSON files
+DEFAULT_RULES_FILE = str(Path(__file__).parent / "config" / "work-type-rules.json")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class WorkTypeNormalizer:
+    """Normalize work types with a compiled set of rules.
+
+    Every rule is compiled into a single lookup table from the (optionally
+    folded) work type to its standard name and the kind of rule that applies,
+    and results are memoized per distinct work type, so normalizing an entry
+    costs one or two dict lookups.
+    """
+
+    def __init__(self, rules: Dict[str, Any]):
+        self.rules_hash = hashlib.sha256(json.dumps(
+            rules, sort_keys=True, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')).hexdigest()
+        self.fold_case = rules.get("fold_case", False)
+        self.fold_whitespace = rules.get("fold_whitespace", False)
+
+        self.overrides = {
+            (override["work_name"], override["character_name"]): override["work_type"]
+            for override in rules.get("overrides", [])
+        }
+
+        # Exact matches first, so folding never changes what an exact rule says
+        exact: Dict[str, Tuple[str, str]] = {}
+        mapping = rules.get("map", {})
+        for work_type in rules.get("types", []):
+            exact[work_type] = (work_type, "type")
+        for work_type, standard in mapping.items():
+            exact[work_type] = (mapping.get(standard, standard), "map")
+        split = rules.get("split", {})
+        separator = split.get("separator", "/")
+        for work_type in split.get("types", []):
+            primary = work_type.split(separator)[0].strip()
+            exact[work_type] = (mapping.get(primary, primary), "split")
+
+        self.table = dict(exact)
+        for work_type, target in exact.items():
+            self.table.setdefault(self.fold(work_type), target)
+        self._memo: Dict[str, Tuple[str, Optional[str]]] = {}
+
+    def __getstate__(self):
+        # Workers rebuild their own memo
+        state = self.__dict__.copy()
+        state["_memo"] = {}
+        return state
+
+    def fold(self, work_type: str) -> str:
+        """Return the lookup key of a work type under the folding rules."""
+        if self.fold_whitespace:
+            work_type = _WHITESPACE.sub(" ", work_type).strip()
+        if self.fold_case:
+            work_type = work_type.casefold()
+        return work_type
+
+    def resolve_type(self, work_type: str) -> Tuple[str, Optional[str]]:
+        """Return (standard work type, rule kind) for a work type on its own.
+
+        The rule kind is "map", "split" or "fold" (same type, different case
+        or whitespace) if the work type changes, and None if it does not.
+        Work types that are not strings are left unchanged.
+        """
+        if not isinstance(work_type, str):
+            return work_type, None
+        result = self._memo.get(work_type)
+        if result is None:
+            target = self.table.get(work_type)
+            if target is None:
+                target = self.table.get(self.fold(work_type))
+            if target is None or target[0] == work_type:
+                result = (work_type, None)
+            else:
+                standard, kind = target
+                result = (standard, "fold" if kind == "type" else kind)
+            self._memo[work_type] = result
+        return result
+
+    def resolve(self, work_type: str, work_name: Any = None,
+                character_name: Any = None) -> Tuple[str, Optional[str]]:
+        """Return (standard work type, rule kind) for an entry's work type.
+
+        Overrides for the (work_name, character_name) pair win over every other
+        rule and are reported with the kind "override". Names that are not
+        strings (malformed entries) never match an override.
+        """
+        if isinstance(work_name, str) and isinstance(character_name, str):
+            override = self.overrides.get((work_name, character_name))
+            if override is not None:
+                return override, ("override" if override != work_type else None)
+        return self.resolve_type(work_type)
+
+    def normalize_entry(self, entry: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+        """Normalize an entry's work_type in place.
+
+        Returns (old work type, new work type, rule kind) if it changed, else None.
+        Entries without a string work_type are left alone.
+        """
+        work_type = entry.get("work_type")
+        if not isinstance(work_type, str):
+            return None
+        new_type, kind = self.resolve(work_type, entry.get("work_name"),
+                                      entry.get("character_name"))
+        if kind is None:
+            return None
+        entry["work_type"] = new_type
+        return work_type, new_type, kind
+
+
+@lru_cache(maxsize=None)
+def load_rules(rules_file: str = DEFAULT_RULES_FILE) -> WorkTypeNormalizer:
+    """Load and compile a rules file (once per file per process)."""
+    with open(rules_file, 'r', encoding='utf-8') as f:
+        return WorkTypeNormalizer(json.load(f))